@@ -0,0 +1,100 @@
+# coding: utf-8
+
+"""
+Deterministic generator of synthetic C sources for the benchmarks.
+
+Every case is a function of (size, rng) returning the main file and a dict
+of headers included from it. The same name, size and seed always give the
+same text.
+"""
+
+import random
+
+_BINARY_OPERATORS = ("+", "-", "*", "/", "%", "&", "|", "^", "<<", ">>")
+
+def operator_chain(size, rng):
+    lines = ["int chain(%s)" % ", ".join("int a%d" % i for i in range(8)), "{", "    int r = 0;"]
+    for _ in range(size // 10 or 1):
+        operands = ["a%d" % rng.randrange(8) if rng.random() < 0.7 else str(rng.randrange(1, 100)) for _ in range(size)]
+        expression = operands[0]
+        for operand in operands[1:]:
+            expression += " %s %s" % (rng.choice(_BINARY_OPERATORS), operand)
+        lines.append("    r += %s;" % expression)
+    lines += ["    return r;", "}"]
+    return "\n".join(lines) + "\n", {}
+
+def deep_nesting(size, rng):
+    lines = ["int nest(int n)", "{", "    int r = 0;", "    int %s;" % ", ".join("i%d" % i for i in range(size))]
+    indent = "    "
+    for depth in range(size):
+        if depth % 2:
+            lines.append("%sif (n > %d) {" % (indent, rng.randrange(100)))
+        else:
+            lines.append("%sfor (i%d = 0; i%d < n; i%d++) {" % (indent, depth, depth, depth))
+        indent += "    "
+        lines.append("%sr += %d;" % (indent, rng.randrange(100)))
+    for depth in range(size):
+        indent = indent[:-4]
+        lines.append("%s}" % indent)
+    lines += ["    return r;", "}"]
+    return "\n".join(lines) + "\n", {}
+
+def large_initializer(size, rng):
+    values = ", ".join(str(rng.randrange(1 << 16)) for _ in range(size * 10))
+    strings = ", ".join('"s%d"' % rng.randrange(1000) for _ in range(size))
+    source = "unsigned int table[] = {%s};\nconst char *names[] = {%s};\n" % (values, strings)
+    return source, {}
+
+def header_prototypes(size, rng):
+    header = "".join("int proto%d(int a, const char *b, unsigned long c);\n" % i for i in range(size * 10))
+    calls = "".join("    r += proto%d(%d, \"x\", %dUL);\n" % (i, rng.randrange(100), rng.randrange(100))
+                    for i in rng.sample(range(size * 10), size))
+    source = "#include \"bench.h\"\nint caller(void)\n{\n    int r = 0;\n%s    return r;\n}\n" % calls
+    return source, {"bench.h": header}
+
+def member_chain(size, rng):
+    lines = [
+        "typedef struct _NODE { struct _NODE *next; int value; int (*read)(struct _NODE *, int); } NODE;",
+        "int walk(NODE *p, NODE q)",
+        "{",
+        "    int r = 0;",
+    ]
+    for _ in range(size):
+        depth = rng.randrange(1, 10)
+        chain = "p" + "->next" * depth
+        if rng.random() < 0.5:
+            lines.append("    r += %s->value + q.next->value;" % chain)
+        else:
+            lines.append("    r += %s->read(%s, %d);" % (chain, chain, rng.randrange(100)))
+    lines += ["    return r;", "}"]
+    return "\n".join(lines) + "\n", {}
+
+def loop_body(size, rng):
+    lines = ["void callee(int);", "int loop(int *buffer, int n)", "{", "    int i;", "    int sum = 0;", "    for (i = 0; i < n; i++) {"]
+    for _ in range(size * 5):
+        choice = rng.randrange(4)
+        if choice == 0:
+            lines.append("        sum += buffer[i] * %d;" % rng.randrange(100))
+        elif choice == 1:
+            lines.append("        buffer[i] = (int)(sum >> %d);" % rng.randrange(16))
+        elif choice == 2:
+            lines.append("        if (sum > %d) { callee(sum); }" % rng.randrange(1000))
+        else:
+            lines.append("        sum = sum ? sum - 1 : %d;" % rng.randrange(100))
+    lines += ["    }", "    return sum;", "}"]
+    return "\n".join(lines) + "\n", {}
+
+CASES = (
+    ("operator_chain", operator_chain, 100),
+    ("deep_nesting", deep_nesting, 40),
+    ("large_initializer", large_initializer, 500),
+    ("header_prototypes", header_prototypes, 200),
+    ("member_chain", member_chain, 300),
+    ("loop_body", loop_body, 200),
+)
+
+def generate(name, scale=1.0, seed=0):
+    for case_name, generator, size in CASES:
+        if case_name == name:
+            return generator(max(1, int(size * scale)), random.Random("%s:%d" % (name, seed)))
+    raise KeyError(name)
@@ -0,0 +1,143 @@
+# coding: utf-8
+
+"""
+Benchmark suite over the synthetic corpus of bench.corpus: parse, wrap,
+query and peak memory of wrapping for every case, reported as JSON and
+optionally compared against a stored baseline.
+
+    python -m bench.run [--cases NAME ...] [--scale X] [--repeat N] [--seed N]
+                        [--startup RUNS] [--output FILE]
+                        [--baseline FILE] [--threshold RATIO]
+
+Exits with status 1 when a metric is slower (or larger) than the baseline
+by more than the threshold.
+"""
+
+import argparse
+import gc
+import json
+import os
+import sys
+import timeit
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+import clang.cindex
+import clang_ast_wrapper.node as cn
+import clang_ast_wrapper.util as cu
+
+from bench import corpus
+from bench import startup
+
+_INCLUDE_DIR = os.path.abspath("bench_include")
+
+def parse(source, headers):
+    unsaved_files = [("bench.c", source)]
+    unsaved_files += [(os.path.join(_INCLUDE_DIR, name), text) for name, text in sorted(headers.items())]
+    index = clang.cindex.Index.create()
+    return index.parse("bench.c", args=["-I" + _INCLUDE_DIR], unsaved_files=unsaved_files)
+
+def query(root):
+    count = 0
+    for decl in root.nodes_of_type(cn.DeclNode):
+        count += decl.referrer_count
+    count += sum(1 for _ in root.nodes_of_kind("BINARY_OPERATOR"))
+    matcher = cu.CallMatcher(["callee", "proto0", "proto1", "read"])
+    count += sum(1 for _ in matcher.find_calls(root))
+    table = root.get_token_table()
+    for offset in table.starts[::16]:
+        if root.find_token_owner(offset) is not None:
+            count += 1
+    return count
+
+def timed(func, *args):
+    gc.collect()
+    start = timeit.default_timer()
+    result = func(*args)
+    return timeit.default_timer() - start, result
+
+def measure_memory(tu):
+    if tracemalloc is None:
+        return None
+    gc.collect()
+    tracemalloc.start()
+    try:
+        root = cn.TranslationUnitNode(tu.cursor)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    del root
+    return peak
+
+def measure_case(name, scale, seed, repeat):
+    source, headers = corpus.generate(name, scale, seed)
+    samples = {"parse": [], "wrap": [], "query": []}
+    for _ in range(repeat):
+        elapsed, tu = timed(parse, source, headers)
+        samples["parse"].append(elapsed)
+        elapsed, root = timed(cn.TranslationUnitNode, tu.cursor)
+        samples["wrap"].append(elapsed)
+        elapsed, _ = timed(query, root)
+        samples["query"].append(elapsed)
+    result = dict((key, startup.median(values)) for key, values in samples.items())
+    result["nodes"] = len(root.nodes)
+    result["source_bytes"] = len(source) + sum(len(x) for x in headers.values())
+    result["memory_peak"] = measure_memory(tu)
+    return result
+
+def compare(current, baseline, threshold):
+    regressions = []
+    for name, metrics in sorted(current["cases"].items()):
+        base = baseline.get("cases", {}).get(name)
+        if base is None:
+            continue
+        for metric in ("parse", "wrap", "query", "memory_peak"):
+            value = metrics.get(metric)
+            base_value = base.get(metric)
+            if not value or not base_value:
+                continue
+            ratio = float(value) / base_value
+            flag = ""
+            if ratio > 1.0 + threshold:
+                flag = "REGRESSION"
+                regressions.append((name, metric, ratio))
+            sys.stderr.write("%-20s %-12s %14.6g %14.6g %7.2fx %s\n" % (name, metric, base_value, value, ratio, flag))
+    return regressions
+
+def main(argv=None):
+    names = [x[0] for x in corpus.CASES]
+    parser = argparse.ArgumentParser(description="Run the parse/wrap/query/memory benchmarks over the synthetic corpus.")
+    parser.add_argument("--cases", nargs="+", choices=names, default=names)
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--startup", type=int, default=0, metavar="RUNS", help="also run bench.startup with RUNS runs")
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--baseline", default=None)
+    parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    result = {
+        "settings": {"scale": args.scale, "repeat": args.repeat, "seed": args.seed},
+        "cases": dict((name, measure_case(name, args.scale, args.seed, args.repeat)) for name in args.cases),
+    }
+    if args.startup:
+        result["startup"] = startup.measure(args.startup)
+    text = json.dumps(result, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(result, baseline, args.threshold):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,65 @@
+# coding: utf-8
+
+"""
+Startup benchmark: import of clang.cindex and the first parse, each sample
+measured in a fresh interpreter as a CLI tool or a pre-commit hook would run.
+
+    python -m bench.startup [--runs N] [--output FILE]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import timeit
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_SCRIPT = r"""
+import json
+import timeit
+start = timeit.default_timer()
+import clang.cindex
+imported = timeit.default_timer()
+index = clang.cindex.Index.create()
+tu = index.parse("sample.c", unsaved_files=(("sample.c", "int main(void) { return 0; }"),))
+children = list(tu.cursor.get_children())
+parsed = timeit.default_timer()
+print(json.dumps({"import": imported - start, "first_parse": parsed - imported}))
+"""
+
+def measure_once():
+    start = timeit.default_timer()
+    output = subprocess.check_output([sys.executable, "-c", _SCRIPT], cwd=_ROOT)
+    elapsed = timeit.default_timer() - start
+    result = json.loads(output.decode("utf-8").strip().splitlines()[-1])
+    result["process"] = elapsed
+    return result
+
+def median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+def measure(runs):
+    samples = [measure_once() for _ in range(runs)]
+    return dict((key, median([x[key] for x in samples])) for key in ("import", "first_parse", "process"))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure import-to-first-parse latency of clang.cindex.")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args(argv)
+
+    result = {"startup": measure(args.runs)}
+    text = json.dumps(result, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+if __name__ == "__main__":
+    main()
@@ -63,6 +63,7 @@ call is efficient.
 # o implement additional SourceLocation, SourceRange, and File methods.
 
 from ctypes import *
+import array
 import collections
 
 import clang.enumerations
@@ -106,6 +107,7 @@ if sys.version_info[0] == 3:
         return x.encode('utf8')
 
     xrange = range
+    intern = sys.intern
 
 elif sys.version_info[0] == 2:
     # Python 2 strings are utf8 byte strings, no translation is needed for
@@ -231,6 +233,38 @@ class SourceLocation(Structure):
             self._data = (f, int(l.value), int(c.value), int(o.value))
         return self._data
 
+    def get_file_offset(self):
+        """Return a (file handle, offset) tuple for this location.
+
+        The file handle is an integer identifying the file within its
+        translation unit (see File.handle), or None. Unlike file and offset,
+        this creates no File object.
+        """
+        if self._data is not None:
+            f = self._data[0]
+            return (f.handle if f else None, self._data[3])
+        f, o = c_object_p(), c_uint()
+        conf.lib.clang_getInstantiationLocation(self, byref(f), None, None,
+                byref(o))
+        # addressof is several times cheaper than cast for the handle.
+        return (addressof(f.contents) if f else None, int(o.value))
+
+    def get_spelling_location(self):
+        """Return the (file, line, column, offset) tuple where the text of this
+        location is spelled.
+
+        This differs from file/line/column/offset for locations inside macro
+        expansions, and it is the location clang_tokenize works with.
+        """
+        f, l, c, o = c_object_p(), c_uint(), c_uint(), c_uint()
+        conf.lib.clang_getSpellingLocation(self, byref(f), byref(l), byref(c),
+                byref(o))
+        if f:
+            f = File(f)
+        else:
+            f = None
+        return (f, int(l.value), int(c.value), int(o.value))
+
     @staticmethod
     def from_position(tu, file, line, column):
         """
@@ -553,6 +587,12 @@ class TokenGroup(object):
 
             yield token
 
+# Parallel columns describing the tokens of an extent. spellings is a list of
+# interned strings, kinds holds TokenKind values and starts/ends hold the byte
+# offsets of each token within its file.
+TokenArrays = collections.namedtuple("TokenArrays",
+                                     ["spellings", "kinds", "starts", "ends"])
+
 class TokenKind(object):
     """Describes a specific type of a Token."""
 
@@ -591,15 +631,39 @@ class TokenKind(object):
         setattr(TokenKind, name, kind)
 
 ### Cursor Kinds ###
-class BaseEnumeration(object):
+class EnumerationType(type):
+    """
+    Metaclass of the named enumerations.
+
+    Assigning an enumeration instance to a class attribute, as in
+    CursorKind.UNEXPOSED_DECL = CursorKind(1), registers the attribute name as
+    the name of that value. The value-to-name table is therefore complete once
+    the module is loaded and never has to be rebuilt.
+    """
+
+    def __init__(cls, name, bases, attrs):
+        super(EnumerationType, cls).__init__(name, bases, attrs)
+        cls._names = []
+
+    def __setattr__(cls, name, value):
+        super(EnumerationType, cls).__setattr__(name, value)
+        if isinstance(value, cls) and not name.startswith('_'):
+            names = cls._names
+            if value.value >= len(names):
+                names += [None] * (value.value - len(names) + 1)
+            names[value.value] = name
+
+# Python 2 and 3 compatible way of declaring a class with a metaclass.
+_Enumeration = EnumerationType('_Enumeration', (object,), {})
+
+class BaseEnumeration(_Enumeration):
     """
     Common base class for named enumerations held in sync with Index.h values.
 
-    Subclasses must define their own _kinds and _name_map members, as:
+    Subclasses must define their own _kinds member, as:
     _kinds = []
-    _name_map = None
-    These values hold the per-subclass instances and value-to-name mappings,
-    respectively.
+    It holds the per-subclass instances, indexed by value. The value-to-name
+    table _names is maintained by EnumerationType.
 
     """
 
@@ -611,7 +675,6 @@ class BaseEnumeration(object):
                 str(self.__class__), value))
         self.value = value
         self.__class__._kinds[value] = self
-        self.__class__._name_map = None
 
 
     def from_param(self):
@@ -620,12 +683,16 @@ class BaseEnumeration(object):
     @property
     def name(self):
         """Get the enumeration name of this cursor kind."""
-        if self._name_map is None:
-            self._name_map = {}
-            for key, value in self.__class__.__dict__.items():
-                if isinstance(value, self.__class__):
-                    self._name_map[value] = key
-        return self._name_map[self]
+        return self.__class__._names[self.value]
+
+    @classmethod
+    def name_of(cls, id):
+        """Get the enumeration name of a value without looking up its
+        instance."""
+        names = cls._names
+        if id >= len(names) or names[id] is None:
+            raise ValueError('Unknown %s value %d' % (cls.__name__, id))
+        return names[id]
 
     @classmethod
     def from_id(cls, id):
@@ -644,7 +711,6 @@ class CursorKind(BaseEnumeration):
 
     # The required BaseEnumeration declarations.
     _kinds = []
-    _name_map = None
 
     @staticmethod
     def get_all_kinds():
@@ -1357,7 +1423,6 @@ class TemplateArgumentKind(BaseEnumeration):
 
     # The required BaseEnumeration declarations.
     _kinds = []
-    _name_map = None
 
 TemplateArgumentKind.NULL = TemplateArgumentKind(0)
 TemplateArgumentKind.TYPE = TemplateArgumentKind(1)
@@ -1374,7 +1439,6 @@ class ExceptionSpecificationKind(BaseEnumeration):
 
     # The required BaseEnumeration declarations.
     _kinds = []
-    _name_map = None
 
     def __repr__(self):
         return 'ExceptionSpecificationKind.{}'.format(self.name)
@@ -1786,12 +1850,78 @@ class Cursor(Structure):
     def walk_preorder(self):
         """Depth-first preorder walk over the cursor and its descendants.
 
-        Yields cursors.
+        Yields cursors. The walk keeps a stack of child iterators instead of
+        recursing, and reads the children of a cursor only when it descends
+        into them, once per cursor.
         """
         yield self
-        for child in self.get_children():
-            for descendant in child.walk_preorder():
-                yield descendant
+        stack = [self.get_children()]
+        while stack:
+            for child in stack[-1]:
+                yield child
+                stack.append(child.get_children())
+                break
+            else:
+                stack.pop()
+
+    def walk_postorder(self):
+        """Depth-first postorder walk over the cursor and its descendants.
+
+        Yields cursors. Like walk_preorder, the walk keeps a stack of child
+        iterators and reads the children of each cursor once. A cursor is
+        yielded when its iterator is exhausted.
+        """
+        stack = [(self, self.get_children())]
+        while stack:
+            cursor, children = stack[-1]
+            for child in children:
+                stack.append((child, child.get_children()))
+                break
+            else:
+                stack.pop()
+                yield cursor
+
+    def walk_filtered(self, kinds=None, prune=None):
+        """Depth-first preorder walk yielding only cursors of the given kinds.
+
+        kinds is an iterable of CursorKind values; None selects every kind.
+        prune is an optional predicate called with each cursor. When it returns
+        True the descendants of that cursor are skipped, although the cursor
+        itself is still yielded if its kind matches.
+
+        Returns an iterator over the matching cursors, collected by a single
+        clang_visitChildren call.
+        """
+        if kinds is None:
+            kind_ids = None
+        else:
+            kind_ids = frozenset(kind.value for kind in kinds)
+
+        cursors = []
+        if kind_ids is None or self._kind_id in kind_ids:
+            cursors.append(self)
+        if prune is not None and prune(self):
+            return iter(cursors)
+
+        tu = self._tu
+        errors = []
+        def visitor(child, parent, cursors):
+            try:
+                # Create reference to TU so it isn't GC'd before Cursor.
+                child._tu = tu
+                if kind_ids is None or child._kind_id in kind_ids:
+                    cursors.append(child)
+                if prune is not None and prune(child):
+                    return 1 # continue
+                return 2 # recurse
+            except Exception as e:
+                errors.append(e)
+                return 0 # break
+        conf.lib.clang_visitChildren(self, callbacks['cursor_visit'](visitor),
+            cursors)
+        if errors:
+            raise errors[0]
+        return iter(cursors)
 
     def get_tokens(self):
         """Obtain Token instances formulating that compose this Cursor.
@@ -1801,6 +1931,28 @@ class Cursor(Structure):
         """
         return TokenGroup.get_tokens(self._tu, self.extent)
 
+    def evaluate_integer(self):
+        """Evaluate the expression pointed at by this Cursor as an integer.
+
+        Returns None if the expression is not an integer constant, or if the
+        loaded libclang does not provide clang_Cursor_Evaluate.
+        """
+        if not conf.function_exists("clang_EvalResult_getAsUnsigned"):
+            return None
+
+        result = conf.lib.clang_Cursor_Evaluate(self)
+        if not result:
+            return None
+        try:
+            # CXEval_Int
+            if conf.lib.clang_EvalResult_getKind(result) != 1:
+                return None
+            if conf.lib.clang_EvalResult_isUnsignedInt(result):
+                return conf.lib.clang_EvalResult_getAsUnsigned(result)
+            return conf.lib.clang_EvalResult_getAsLongLong(result)
+        finally:
+            conf.lib.clang_EvalResult_dispose(result)
+
     def get_field_offsetof(self):
         """Returns the offsetof the FIELD_DECL pointed by this Cursor."""
         return conf.lib.clang_Cursor_getOffsetOfField(self)
@@ -1858,36 +2010,18 @@ class Cursor(Structure):
         res._tu = args[0]._tu
         return res
 
-class StorageClass(object):
+class StorageClass(BaseEnumeration):
     """
     Describes the storage class of a declaration
     """
 
     # The unique kind objects, index by id.
     _kinds = []
-    _name_map = None
 
     def __init__(self, value):
-        if value >= len(StorageClass._kinds):
-            StorageClass._kinds += [None] * (value - len(StorageClass._kinds) + 1)
-        if StorageClass._kinds[value] is not None:
+        if value < len(StorageClass._kinds) and StorageClass._kinds[value] is not None:
             raise ValueError('StorageClass already loaded')
-        self.value = value
-        StorageClass._kinds[value] = self
-        StorageClass._name_map = None
-
-    def from_param(self):
-        return self.value
-
-    @property
-    def name(self):
-        """Get the enumeration name of this storage class."""
-        if self._name_map is None:
-            self._name_map = {}
-            for key,value in StorageClass.__dict__.items():
-                if isinstance(value,StorageClass):
-                    self._name_map[value] = key
-        return self._name_map[self]
+        super(StorageClass, self).__init__(value)
 
     @staticmethod
     def from_id(id):
@@ -1917,7 +2051,6 @@ class AccessSpecifier(BaseEnumeration):
 
     # The unique kind objects, index by id.
     _kinds = []
-    _name_map = None
 
     def from_param(self):
         return self.value
@@ -1940,7 +2073,6 @@ class TypeKind(BaseEnumeration):
 
     # The unique kind objects, indexed by id.
     _kinds = []
-    _name_map = None
 
     @property
     def spelling(self):
@@ -2049,7 +2181,6 @@ class RefQualifierKind(BaseEnumeration):
 
     # The unique kind objects, indexed by id.
     _kinds = []
-    _name_map = None
 
     def from_param(self):
         return self.value
@@ -2743,6 +2874,9 @@ class TranslationUnit(ClangObject):
         """
         assert isinstance(index, Index)
         self.index = index
+        # Incremented by reparse() so that cursor caches can tell stale
+        # entries apart.
+        self.generation = 0
         ClangObject.__init__(self, ptr)
 
     def __del__(self):
@@ -2882,11 +3016,12 @@ class TranslationUnit(ClangObject):
                     print(value)
                 if not isinstance(value, str):
                     raise TypeError('Unexpected unsaved file contents.')
-                unsaved_files_array[i].name = name
-                unsaved_files_array[i].contents = value
+                unsaved_files_array[i].name = b(name)
+                unsaved_files_array[i].contents = b(value)
                 unsaved_files_array[i].length = len(value)
         ptr = conf.lib.clang_reparseTranslationUnit(self, len(unsaved_files),
                 unsaved_files_array, options)
+        self.generation += 1
 
     def save(self, filename):
         """Saves the TranslationUnit to a file.
@@ -2955,6 +3090,20 @@ class TranslationUnit(ClangObject):
             return CodeCompletionResults(ptr)
         return None
 
+    def get_file_contents(self, file):
+        """Return the contents of a file of this translation unit as bytes.
+
+        Unsaved files are returned as they were passed to the parser. Returns
+        None if the loaded libclang does not provide clang_getFileContents.
+        """
+        if not conf.function_exists("clang_getFileContents"):
+            return None
+        size = c_size_t()
+        contents = conf.lib.clang_getFileContents(self, file, byref(size))
+        if not contents:
+            return None
+        return string_at(contents, size.value)
+
     def get_tokens(self, locations=None, extent=None):
         """Obtain tokens in this translation unit.
 
@@ -2968,6 +3117,77 @@ class TranslationUnit(ClangObject):
 
         return TokenGroup.get_tokens(self, extent)
 
+    def tokenize_arrays(self, extent):
+        """Obtain all tokens in an extent as parallel arrays.
+
+        Returns a TokenArrays tuple. The extent is tokenized by a single
+        clang_tokenize call and the tokens are disposed of before returning,
+        so no Token instances are created.
+
+        The end offset of a token is its start offset plus the length of its
+        spelling.
+        """
+        return self._tokenize_arrays(extent, False)[0]
+
+    def annotate_tokens(self, extent):
+        """Obtain all tokens in an extent and the cursors they belong to.
+
+        Returns a (TokenArrays, cursors) tuple where cursors is a list parallel
+        to the token arrays. All tokens are annotated by a single
+        clang_annotateTokens call.
+        """
+        return self._tokenize_arrays(extent, True)
+
+    def _tokenize_arrays(self, extent, annotate):
+        spellings = []
+        kinds = array.array("B")
+        starts = array.array("l")
+        ends = array.array("l")
+        cursors = []
+
+        tokens_memory = POINTER(Token)()
+        tokens_count = c_uint()
+        conf.lib.clang_tokenize(self, extent, byref(tokens_memory),
+                byref(tokens_count))
+        count = int(tokens_count.value)
+        if count < 1:
+            return TokenArrays(spellings, kinds, starts, ends), cursors
+
+        try:
+            lib = conf.lib
+            tokens = cast(tokens_memory, POINTER(Token * count)).contents
+            # The tokens are lexed from one file buffer, where the raw
+            # encoding of a location is its offset plus a base shared by the
+            # whole file. The base is read from the first token, so the other
+            # tokens need no location calls.
+            offset = c_uint()
+            lib.clang_getInstantiationLocation(
+                    lib.clang_getTokenLocation(self, tokens[0]), None, None,
+                    None, byref(offset))
+            base = tokens[0].int_data[1] - int(offset.value)
+            get_spelling = lib.clang_getTokenSpelling
+            get_kind = lib.clang_getTokenKind
+            for token in tokens:
+                spelling = intern(get_spelling(self, token))
+                start = token.int_data[1] - base
+                spellings.append(spelling)
+                kinds.append(get_kind(token))
+                starts.append(start)
+                ends.append(start + len(b(spelling)))
+
+            if annotate:
+                cursors_array = (Cursor * count)()
+                lib.clang_annotateTokens(self, tokens_memory, count,
+                        cursors_array)
+                for cursor in cursors_array:
+                    # Create reference to TU so it isn't GC'd before Cursor.
+                    cursor._tu = self
+                    cursors.append(cursor)
+        finally:
+            conf.lib.clang_disposeTokens(self, tokens_memory, tokens_count)
+
+        return TokenArrays(spellings, kinds, starts, ends), cursors
+
 class File(ClangObject):
     """
     The File class represents a particular source file that is part of a
@@ -2989,6 +3209,12 @@ class File(ClangObject):
         """Return the last modification time of the file."""
         return conf.lib.clang_getFileTime(self)
 
+    @property
+    def handle(self):
+        """Return an integer identifying this file within its translation
+        unit."""
+        return addressof(self.obj.contents)
+
     def __str__(self):
         return self.name
 
@@ -3671,6 +3897,10 @@ functionList = [
    Type,
    Type.from_result),
 
+  ("clang_getSpellingLocation",
+   [SourceLocation, POINTER(c_object_p), POINTER(c_uint), POINTER(c_uint),
+    POINTER(c_uint)]),
+
   ("clang_getSpecializedCursorTemplate",
    [Cursor],
    Cursor,
@@ -3911,6 +4141,37 @@ functionList = [
    c_uint),
 ]
 
+# Functions which are used only when the loaded libclang provides them. They
+# are never required by the compatibility check.
+optionalFunctionList = [
+  ("clang_Cursor_Evaluate",
+   [Cursor],
+   c_void_p),
+
+  ("clang_EvalResult_dispose",
+   [c_void_p]),
+
+  ("clang_EvalResult_getAsLongLong",
+   [c_void_p],
+   c_longlong),
+
+  ("clang_EvalResult_getAsUnsigned",
+   [c_void_p],
+   c_ulonglong),
+
+  ("clang_EvalResult_getKind",
+   [c_void_p],
+   c_int),
+
+  ("clang_EvalResult_isUnsignedInt",
+   [c_void_p],
+   c_uint),
+
+  ("clang_getFileContents",
+   [TranslationUnit, File, POINTER(c_size_t)],
+   c_void_p),
+]
+
 class LibclangError(Exception):
     def __init__(self, message):
         self.m = message
@@ -3939,6 +4200,8 @@ def register_function(lib, item, ignore_errors):
     if len(item) == 4:
         func.errcheck = item[3]
 
+    return func
+
 def register_functions(lib, ignore_errors):
     """Register function prototypes with a libclang library instance.
 
@@ -3952,6 +4215,50 @@ def register_functions(lib, ignore_errors):
     for f in functionList:
         register(f)
 
+    for f in optionalFunctionList:
+        register_function(lib, f, True)
+
+class LazyLibrary(object):
+    """Proxy for a libclang library instance which registers the prototype of
+    each function the first time it is used.
+
+    Once registered, the function is stored on the proxy, so later lookups are
+    plain attribute accesses. Requesting a function missing from the library
+    raises LibclangError for functions of functionList (unless ignore_errors is
+    set) and AttributeError otherwise.
+    """
+
+    _functions = None
+
+    def __init__(self, lib, ignore_errors):
+        self._lib = lib
+        self._ignore_errors = ignore_errors
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+
+        if LazyLibrary._functions is None:
+            functions = {}
+            for item in optionalFunctionList:
+                functions[item[0]] = (item, True)
+            for item in functionList:
+                functions[item[0]] = (item, False)
+            LazyLibrary._functions = functions
+
+        entry = LazyLibrary._functions.get(name)
+        if entry is None:
+            func = getattr(self._lib, name)
+        else:
+            item, optional = entry
+            func = register_function(self._lib, item,
+                                     optional or self._ignore_errors)
+            if func is None:
+                raise AttributeError(name)
+
+        setattr(self, name, func)
+        return func
+
 class Config:
     library_path = None
     library_file = None
@@ -4003,9 +4310,8 @@ class Config:
     @CachedProperty
     def lib(self):
         lib = self.get_cindex_library()
-        register_functions(lib, not Config.compatibility_check)
         Config.loaded = True
-        return lib
+        return LazyLibrary(lib, not Config.compatibility_check)
 
     def get_filename(self):
         if Config.library_file:
@@ -4040,7 +4346,7 @@ class Config:
     def function_exists(self, name):
         try:
             getattr(self.lib, name)
-        except AttributeError:
+        except (AttributeError, LibclangError):
             return False
 
         return True
@@ -4066,6 +4372,7 @@ __all__ = [
     'Index',
     'SourceLocation',
     'SourceRange',
+    'TokenArrays',
     'TokenKind',
     'Token',
     'TranslationUnitLoadError',
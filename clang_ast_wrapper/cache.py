@@ -0,0 +1,78 @@
+# coding: utf-8
+
+"""
+Memo tables for libclang cursor queries.
+
+Each query has its own table keyed by cursor. Queries are fixed when
+they are registered: the built-in ones below, or ones added with
+register(), such as the macro-aware token spellings of
+TranslationUnitNode. Entries are never evicted one by one. A cache lives
+as long as the TranslationUnitNode holding it. clear() empties it, and
+it clears itself after the translation unit is reparsed.
+"""
+
+def cursor_key(cursor):
+    # The fields compared by clang_equalCursors. Reading them avoids a
+    # clang_hashCursor round trip for every lookup.
+    data = cursor.data
+    return (cursor._kind_id, cursor.xdata, data[0], data[1], data[2])
+
+_queries = {
+    "children": lambda cursor: tuple(cursor.get_children()),
+    "extent": lambda cursor: cursor.extent,
+    "type": lambda cursor: cursor.type,
+    "definition": lambda cursor: cursor.get_definition(),
+    "tokens": lambda cursor: tuple(x.spelling for x in cursor.get_tokens()),
+}
+
+class CursorCache(object):
+    def __init__(self, translation_unit):
+        self.translation_unit = translation_unit
+        self.generation = translation_unit.generation
+        self.queries = dict(_queries)
+        self.tables = dict((x, {}) for x in _queries)
+        self.hits = dict.fromkeys(_queries, 0)
+        self.misses = dict.fromkeys(_queries, 0)
+
+    def register(self, query, compute):
+        if query in self.queries:
+            raise ValueError("Query %s is already registered." % query)
+        self.queries[query] = compute
+        self.tables[query] = {}
+        self.hits[query] = self.misses[query] = 0
+
+    def lookup(self, query, cursor):
+        if self.generation != self.translation_unit.generation:
+            self.clear()
+        table = self.tables[query]
+        key = cursor_key(cursor)
+        value = table.get(key, table)
+        if value is table:
+            self.misses[query] += 1
+            value = table[key] = self.queries[query](cursor)
+        else:
+            self.hits[query] += 1
+        return value
+
+    def children(self, cursor):
+        return self.lookup("children", cursor)
+
+    def extent(self, cursor):
+        return self.lookup("extent", cursor)
+
+    def type(self, cursor):
+        return self.lookup("type", cursor)
+
+    def definition(self, cursor):
+        return self.lookup("definition", cursor)
+
+    def tokens(self, cursor):
+        return self.lookup("tokens", cursor)
+
+    def clear(self):
+        for table in self.tables.values():
+            table.clear()
+        self.generation = self.translation_unit.generation
+
+    def stats(self):
+        return dict((x, (self.hits[x], self.misses[x])) for x in self.queries)
@@ -0,0 +1,151 @@
+# coding: utf-8
+
+"""
+Project-wide call graph.
+
+Functions are numbered densely in the order they are seen and keyed by
+USR, so static functions of different files stay apart. Calls through a
+struct member, such as gBS->AllocatePool(...), go to a member node
+"struct _EFI_BOOT_SERVICES::AllocatePool". The member node has an edge to
+every function stored into that member anywhere in the project, by
+assignment or in an initializer (see clang_ast_wrapper.protocol).
+
+Each translation unit keeps its own caller and callee arrays. The graph
+keeps a sorted array of callees and one of callers per function, and
+counts the units that contribute each edge. update() compares the old and
+new edges of one unit and inserts or deletes only those, so changing a
+file costs one unit's walk and its edges, not a rebuild of the graph, and
+queries return the arrays as they are.
+"""
+
+import array
+import bisect
+import collections
+
+import clang_ast_wrapper.node as cn
+import clang_ast_wrapper.protocol as cp
+import clang_ast_wrapper.util as cu
+
+class CallGraph(object):
+    def __init__(self):
+        self.keys = []
+        self.names = []
+        self.key_ids = {}
+        self.name_ids = collections.defaultdict(list)
+        self.is_member = bytearray()
+        # unit -> (caller ids, callee ids, ids of functions defined in it)
+        self.units = {}
+        self.callees = []
+        self.callers = []
+        # (caller, callee) -> number of units with the edge
+        self.edge_counts = {}
+        # Per function: number of units defining it.
+        self.defined_counts = array.array("l")
+
+    def __repr__(self):
+        return "%s: %d functions, %d units" % (type(self).__name__, len(self.keys), len(self.units))
+
+    def get_id(self, key, name, is_member=False):
+        function_id = self.key_ids.get(key)
+        if function_id is None:
+            function_id = self.key_ids[key] = len(self.keys)
+            self.keys.append(key)
+            self.names.append(name)
+            self.name_ids[name].append(function_id)
+            self.is_member.append(1 if is_member else 0)
+            self.callees.append(array.array("l"))
+            self.callers.append(array.array("l"))
+            self.defined_counts.append(0)
+        return function_id
+
+    def function_id(self, function):
+        return self.get_id(function.usr or "c:@F@" + function.name, function.name)
+
+    def member_id(self, key):
+        name = "%s::%s" % key
+        return self.get_id(name, name, True)
+
+    def update(self, unit, root):
+        edges = set()
+        defined = array.array("l")
+        for function in root.function_defs:
+            defined.append(self.function_id(function))
+        for call in root.nodes_of_type(cn.CallExprNode):
+            function = root.enclosing_function(call)
+            if function is None:
+                continue
+            caller = self.function_id(function)
+            callee = call.function
+            target = cu.referenced_function(callee)
+            if target is not None:
+                edges.add((caller, self.function_id(target)))
+            elif isinstance(callee, cn.MemberRefExprNode):
+                edges.add((caller, self.member_id(cp.member_key(callee))))
+        for key, node, value in cp.iter_member_assignments(root):
+            target = cu.referenced_function(value)
+            if target is not None:
+                edges.add((self.member_id(key), self.function_id(target)))
+        old_edges, old_defined = self.unit_edges(unit)
+        self.units[unit] = (array.array("l", (x[0] for x in edges)), array.array("l", (x[1] for x in edges)), defined)
+        self.apply_edges(old_edges - edges, edges - old_edges, old_defined, set(defined))
+
+    def remove(self, unit):
+        old_edges, old_defined = self.unit_edges(unit)
+        if self.units.pop(unit, None) is not None:
+            self.apply_edges(old_edges, (), old_defined, set())
+
+    def unit_edges(self, unit):
+        callers, callees, defined = self.units.get(unit, ((), (), ()))
+        return set(zip(callers, callees)), set(defined)
+
+    def apply_edges(self, removed, added, old_defined, new_defined):
+        edge_counts = self.edge_counts
+        for edge in removed:
+            count = edge_counts[edge] - 1
+            if count:
+                edge_counts[edge] = count
+            else:
+                del edge_counts[edge]
+                _discard(self.callees[edge[0]], edge[1])
+                _discard(self.callers[edge[1]], edge[0])
+        for edge in added:
+            count = edge_counts.get(edge, 0)
+            edge_counts[edge] = count + 1
+            if not count:
+                bisect.insort(self.callees[edge[0]], edge[1])
+                bisect.insort(self.callers[edge[1]], edge[0])
+        for function_id in old_defined - new_defined:
+            self.defined_counts[function_id] -= 1
+        for function_id in new_defined - old_defined:
+            self.defined_counts[function_id] += 1
+
+    def successors(self, function_id):
+        return self.callees[function_id][:]
+
+    def predecessors(self, function_id):
+        return self.callers[function_id][:]
+
+    def is_defined(self, function_id):
+        return function_id < len(self.defined_counts) and self.defined_counts[function_id] > 0
+
+    def find(self, name):
+        return list(self.name_ids.get(name, ()))
+
+    def reachable(self, roots):
+        callees = self.callees
+        flags = bytearray(len(self.keys))
+        stack = list(roots)
+        for x in stack:
+            flags[x] = 1
+        while stack:
+            function_id = stack.pop()
+            for callee in callees[function_id]:
+                if not flags[callee]:
+                    flags[callee] = 1
+                    stack.append(callee)
+        return flags
+
+def _discard(items, item):
+    index = bisect.bisect_left(items, item)
+    if index < len(items) and items[index] == item:
+        del items[index]
@@ -0,0 +1,264 @@
+# coding: utf-8
+
+"""
+Control-flow graphs of function bodies.
+
+Blocks are numbered from 0; ENTRY (0) holds the first statements of the
+body and EXIT (1) is the empty block every return reaches. The contents
+of a block are the node ids of the statements and branch conditions
+evaluated in it, in order; block_of() and position_of() also accept nodes
+nested in them. Blocks, their contents and their edges are
+stored in CSR form:
+
+    node_ids[block_starts[b]:block_starts[b + 1]]    nodes of block b
+    succ_blocks[succ_starts[b]:succ_starts[b + 1]]   successors of b
+    pred_blocks[pred_starts[b]:pred_starts[b + 1]]   predecessors of b
+
+Expressions are not split, so && || ?: and calls to functions that do not
+return stay inside one block.
+"""
+
+import array
+import bisect
+
+import clang_ast_wrapper.node as cn
+
+ENTRY = 0
+EXIT = 1
+
+class ControlFlowGraph(object):
+    def __init__(self, function, block_starts, node_ids, succ_starts, succ_blocks, pred_starts, pred_blocks):
+        self.function = function
+        self.block_starts = block_starts
+        self.node_ids = node_ids
+        self.succ_starts = succ_starts
+        self.succ_blocks = succ_blocks
+        self.pred_starts = pred_starts
+        self.pred_blocks = pred_blocks
+        self.node_positions = None
+
+    def __repr__(self):
+        return "%s: %s (%d blocks)" % (type(self).__name__, self.function.name, self.block_count)
+
+    @property
+    def block_count(self):
+        return len(self.block_starts) - 1
+
+    def successors(self, block):
+        return self.succ_blocks[self.succ_starts[block]:self.succ_starts[block + 1]]
+
+    def predecessors(self, block):
+        return self.pred_blocks[self.pred_starts[block]:self.pred_starts[block + 1]]
+
+    def block_node_ids(self, block):
+        return self.node_ids[self.block_starts[block]:self.block_starts[block + 1]]
+
+    def block_nodes(self, block):
+        nodes = self.function.tu.nodes
+        return [nodes[x] for x in self.block_node_ids(block)]
+
+    def position_of(self, node):
+        # Index into node_ids of the block entry containing node; nodes
+        # inside an entry are found through their ancestors.
+        if self.node_positions is None:
+            self.node_positions = dict((x, i) for i, x in enumerate(self.node_ids))
+        positions = self.node_positions
+        while node is not None and node is not self.function:
+            position = positions.get(node.node_id)
+            if position is not None:
+                return position
+            node = node.parent
+        return None
+
+    def block_at(self, position):
+        return bisect.bisect_right(self.block_starts, position) - 1
+
+    def block_of(self, node):
+        position = self.position_of(node)
+        if position is None:
+            return None
+        return self.block_at(position)
+
+    def reachable(self):
+        flags = bytearray(self.block_count)
+        flags[ENTRY] = 1
+        stack = [ENTRY]
+        succ_starts = self.succ_starts
+        succ_blocks = self.succ_blocks
+        while stack:
+            block = stack.pop()
+            for index in range(succ_starts[block], succ_starts[block + 1]):
+                successor = succ_blocks[index]
+                if not flags[successor]:
+                    flags[successor] = 1
+                    stack.append(successor)
+        return flags
+
+def _compress(lists):
+    starts = array.array("l", [0])
+    items = array.array("l")
+    for x in lists:
+        items.extend(x)
+        starts.append(len(items))
+    return starts, items
+
+class _Builder(object):
+    def __init__(self):
+        self.blocks = [[], []]
+        self.successors = [[], []]
+        self.break_targets = []
+        self.continue_targets = []
+        self.switches = []
+        self.labels = {}
+        self.gotos = []
+
+    def new_block(self):
+        self.blocks.append([])
+        self.successors.append([])
+        return len(self.blocks) - 1
+
+    def add_edge(self, source, target):
+        if source is not None and target not in self.successors[source]:
+            self.successors[source].append(target)
+
+    def add_node(self, block, node):
+        if block is None:
+            block = self.new_block()
+        self.blocks[block].append(node.node_id)
+        return block
+
+    def build(self, stmt, block):
+        if isinstance(stmt, cn.CompoundStmtNode):
+            for child in stmt.children:
+                block = self.build(child, block)
+            return block
+        elif isinstance(stmt, cn.IfStmtNode):
+            block = self.add_node(block, stmt.condition)
+            then_block = self.new_block()
+            self.add_edge(block, then_block)
+            then_end = self.build(stmt.body, then_block)
+            if stmt.else_body is not None:
+                else_block = self.new_block()
+                self.add_edge(block, else_block)
+                else_end = self.build(stmt.else_body, else_block)
+            else:
+                else_end = block
+            if then_end is None and else_end is None:
+                return None
+            join = self.new_block()
+            self.add_edge(then_end, join)
+            self.add_edge(else_end, join)
+            return join
+        elif isinstance(stmt, cn.WhileStmtNode):
+            condition = self.new_block()
+            self.add_edge(block, condition)
+            self.add_node(condition, stmt.condition)
+            body = self.new_block()
+            after = self.new_block()
+            self.add_edge(condition, body)
+            self.add_edge(condition, after)
+            self.build_loop_body(stmt.body, body, after, condition)
+            return after
+        elif isinstance(stmt, cn.DoStmtNode):
+            body = self.new_block()
+            self.add_edge(block, body)
+            condition = self.new_block()
+            after = self.new_block()
+            self.build_loop_body(stmt.body, body, after, condition)
+            self.add_node(condition, stmt.condition)
+            self.add_edge(condition, body)
+            self.add_edge(condition, after)
+            return after
+        elif isinstance(stmt, cn.ForStmtNode):
+            if stmt.init is not None:
+                block = self.add_node(block, stmt.init)
+            condition = self.new_block()
+            self.add_edge(block, condition)
+            body = self.new_block()
+            after = self.new_block()
+            increment = self.new_block()
+            self.add_edge(condition, body)
+            if stmt.condition is not None:
+                self.add_node(condition, stmt.condition)
+                self.add_edge(condition, after)
+            self.build_loop_body(stmt.body, body, after, increment)
+            if stmt.increment is not None:
+                self.add_node(increment, stmt.increment)
+            self.add_edge(increment, condition)
+            return after
+        elif isinstance(stmt, cn.SwitchStmtNode):
+            block = self.add_node(block, stmt.condition)
+            after = self.new_block()
+            self.switches.append([block, False])
+            self.break_targets.append(after)
+            end = self.build(stmt.body, None)
+            self.break_targets.pop()
+            switch_block, has_default = self.switches.pop()
+            self.add_edge(end, after)
+            if not has_default:
+                self.add_edge(switch_block, after)
+            return after
+        elif isinstance(stmt, (cn.CaseStmtNode, cn.DefaultStmtNode)):
+            label = self.new_block()
+            self.add_edge(block, label)
+            if self.switches:
+                self.add_edge(self.switches[-1][0], label)
+                if isinstance(stmt, cn.DefaultStmtNode):
+                    self.switches[-1][1] = True
+            return self.build(stmt.body, label)
+        elif isinstance(stmt, cn.LabelStmtNode):
+            label = self.new_block()
+            self.add_edge(block, label)
+            self.labels[stmt.label] = label
+            return self.build(stmt.body, label)
+        elif isinstance(stmt, cn.BreakStmtNode):
+            if self.break_targets:
+                self.add_edge(block, self.break_targets[-1])
+            return None
+        elif isinstance(stmt, cn.ContinueStmtNode):
+            if self.continue_targets:
+                self.add_edge(block, self.continue_targets[-1])
+            return None
+        elif isinstance(stmt, cn.GotoStmtNode):
+            if block is not None:
+                self.gotos.append((block, stmt.label))
+            return None
+        elif isinstance(stmt, cn.ReturnStmtNode):
+            block = self.add_node(block, stmt)
+            self.add_edge(block, EXIT)
+            return None
+        else:
+            return self.add_node(block, stmt)
+
+    def build_loop_body(self, stmt, block, break_target, continue_target):
+        self.break_targets.append(break_target)
+        self.continue_targets.append(continue_target)
+        end = self.build(stmt, block)
+        self.continue_targets.pop()
+        self.break_targets.pop()
+        self.add_edge(end, continue_target)
+
+    def finish(self, function):
+        for block, label in self.gotos:
+            if label in self.labels:
+                self.add_edge(block, self.labels[label])
+        predecessors = [[] for _ in self.blocks]
+        for block, targets in enumerate(self.successors):
+            for target in targets:
+                predecessors[target].append(block)
+        block_starts, node_ids = _compress(self.blocks)
+        succ_starts, succ_blocks = _compress(self.successors)
+        pred_starts, pred_blocks = _compress(predecessors)
+        return ControlFlowGraph(function, block_starts, node_ids, succ_starts, succ_blocks, pred_starts, pred_blocks)
+
+def build_cfg(function):
+    if function.body is None:
+        return None
+    builder = _Builder()
+    end = builder.build(function.body, ENTRY)
+    builder.add_edge(end, EXIT)
+    return builder.finish(function)
+
+def iter_cfgs(tu):
+    for function in tu.function_defs:
+        yield build_cfg(function)
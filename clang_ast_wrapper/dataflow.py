@@ -0,0 +1,341 @@
+# coding: utf-8
+
+"""
+Bitset dataflow analyses over control-flow graphs.
+
+solve() runs a worklist over the blocks of a ControlFlowGraph for any
+DataflowProblem whose values are Python ints used as bitsets. Variables
+and definitions of a function are numbered densely by FunctionAccesses,
+which also records what every block entry reads and writes:
+
+    x = ...  x += ...  x++          definitions of x
+    &x                              may-definition of x
+    int x = ...;  parameters        definitions of x
+    int x;                          declaration without a value
+    any other reference to x        use of x
+
+The uses of a block entry are taken to happen before its definitions,
+which is exact for "x = x + 1" but not for a comma expression. A
+may-definition reaches later uses without hiding earlier definitions and
+does not end liveness, but counts as initializing the variable.
+"""
+
+import array
+import collections
+
+import clang_ast_wrapper.node as cn
+from clang_ast_wrapper.cfg import ENTRY, EXIT
+
+_ASSIGNMENT_OPERATORS = {"=", "+=", "-=", "*=", "/=", "%=", "&=", "|=", "^=", "<<=", ">>="}
+
+def iter_bits(bits):
+    index = 0
+    while bits:
+        if bits & 1:
+            yield index
+        bits >>= 1
+        index += 1
+
+class DataflowProblem(object):
+    forward = True
+
+    def boundary(self):
+        return 0
+
+    def initial(self):
+        return 0
+
+    def meet(self, a, b):
+        return a | b
+
+    def transfer(self, block, value):
+        return value
+
+class GenKillProblem(DataflowProblem):
+    def __init__(self, gen, kill, boundary=0, forward=True):
+        self.gen = gen
+        self.kill = kill
+        self.boundary_value = boundary
+        self.forward = forward
+
+    def boundary(self):
+        return self.boundary_value
+
+    def transfer(self, block, value):
+        return self.gen[block] | (value & ~self.kill[block])
+
+def solve(cfg, problem):
+    block_count = cfg.block_count
+    if problem.forward:
+        root = ENTRY
+        starts, blocks = cfg.pred_starts, cfg.pred_blocks
+        next_starts, next_blocks = cfg.succ_starts, cfg.succ_blocks
+    else:
+        root = EXIT
+        starts, blocks = cfg.succ_starts, cfg.succ_blocks
+        next_starts, next_blocks = cfg.pred_starts, cfg.pred_blocks
+
+    # ins are the values before a block in the direction of the analysis.
+    ins = [problem.initial()] * block_count
+    outs = [problem.initial()] * block_count
+    ins[root] = problem.boundary()
+    pending = bytearray(b"\x01") * block_count
+    worklist = collections.deque(range(block_count))
+    meet = problem.meet
+    transfer = problem.transfer
+    while worklist:
+        block = worklist.popleft()
+        pending[block] = 0
+        if block != root:
+            value = None
+            for index in range(starts[block], starts[block + 1]):
+                value = outs[blocks[index]] if value is None else meet(value, outs[blocks[index]])
+            if value is not None:
+                ins[block] = value
+        out = transfer(block, ins[block])
+        if out != outs[block]:
+            outs[block] = out
+            for index in range(next_starts[block], next_starts[block + 1]):
+                successor = next_blocks[index]
+                if not pending[successor]:
+                    pending[successor] = 1
+                    worklist.append(successor)
+    return ins, outs
+
+class FunctionAccesses(object):
+    def __init__(self, cfg):
+        self.cfg = cfg
+        function = cfg.function
+        self.variables = []
+        self.variable_ids = {}
+        self.definitions = []
+        self.definition_variables = array.array("l")
+        # Bitset of the definitions that only may write their variable.
+        self.may_definitions = 0
+        # Per variable: bitset of its definitions.
+        self.variable_definitions = []
+
+        for parameter in function.parameters:
+            self.add_variable(parameter)
+        stack = [function.body]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, cn.VarDeclNode):
+                self.add_variable(node)
+            stack.extend(reversed(node.children))
+
+        self.parameter_definitions = 0
+        for parameter in function.parameters:
+            self.parameter_definitions |= 1 << self.add_definition(parameter, parameter)
+
+        # Per block entry (index into cfg.node_ids): uses as (variable,
+        # node) pairs, definition ids and declared variable ids.
+        self.entry_uses = []
+        self.entry_definitions = []
+        self.entry_declarations = []
+        nodes = function.tu.nodes
+        for node_id in cfg.node_ids:
+            self.add_entry(nodes[node_id])
+
+    def add_variable(self, decl):
+        if decl.node_id not in self.variable_ids:
+            self.variable_ids[decl.node_id] = len(self.variables)
+            self.variables.append(decl)
+            self.variable_definitions.append(0)
+
+    def add_definition(self, node, decl):
+        definition = len(self.definitions)
+        variable = self.variable_ids[decl.node_id]
+        self.definitions.append(node)
+        self.definition_variables.append(variable)
+        self.variable_definitions[variable] |= 1 << definition
+        return definition
+
+    def variable_of(self, node):
+        decl = getattr(node, "decl", None)
+        if decl is None:
+            return None
+        return self.variable_ids.get(decl.node_id)
+
+    def add_entry(self, entry):
+        uses = []
+        definitions = []
+        declarations = []
+        stack = [entry]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, cn.DeclRefExprNode):
+                variable = self.variable_of(node)
+                if variable is not None:
+                    is_use, is_definition, is_must = self.classify(node)
+                    if is_use:
+                        uses.append((variable, node))
+                    if is_definition:
+                        definition = self.add_definition(node, node.decl)
+                        if not is_must:
+                            self.may_definitions |= 1 << definition
+                        definitions.append(definition)
+            elif isinstance(node, cn.VarDeclNode) and node.node_id in self.variable_ids:
+                if node.initial_value is not None:
+                    definitions.append(self.add_definition(node, node))
+                else:
+                    declarations.append(self.variable_ids[node.node_id])
+            stack.extend(reversed(node.children))
+        self.entry_uses.append(uses)
+        self.entry_definitions.append(definitions)
+        self.entry_declarations.append(declarations)
+
+    def classify(self, node):
+        # (is use, is definition, definition surely writes the variable)
+        parent = node.parent
+        if isinstance(parent, cn.BinaryOperatorNode) and parent.operands[0] is node:
+            if parent.operator == "=":
+                return False, True, True
+            elif parent.operator in _ASSIGNMENT_OPERATORS:
+                return True, True, True
+        elif isinstance(parent, cn.UnaryOperatorNode):
+            if parent.operator in ("++", "--"):
+                return True, True, True
+            elif parent.operator == "&":
+                return False, True, False
+        return True, False, False
+
+    def entry_range(self, block):
+        return range(self.cfg.block_starts[block], self.cfg.block_starts[block + 1])
+
+    def definitions_bits(self, entry):
+        bits = 0
+        for definition in self.entry_definitions[entry]:
+            bits |= 1 << definition
+        return bits
+
+    def defined_variables_bits(self, entry):
+        bits = 0
+        for definition in self.entry_definitions[entry]:
+            bits |= 1 << self.definition_variables[definition]
+        return bits
+
+    def killed_variables_bits(self, entry):
+        # Variables surely written by the entry.
+        bits = 0
+        for definition in self.entry_definitions[entry]:
+            if not self.may_definitions >> definition & 1:
+                bits |= 1 << self.definition_variables[definition]
+        return bits
+
+    def used_variables_bits(self, entry):
+        bits = 0
+        for variable, node in self.entry_uses[entry]:
+            bits |= 1 << variable
+        return bits
+
+class ReachingDefinitions(object):
+    def __init__(self, cfg, accesses=None):
+        self.accesses = accesses or FunctionAccesses(cfg)
+        gen = []
+        kill = []
+        for block in range(cfg.block_count):
+            block_gen, block_kill = 0, 0
+            for entry in self.accesses.entry_range(block):
+                block_gen, block_kill = self.apply(entry, block_gen, block_kill)
+            gen.append(block_gen)
+            kill.append(block_kill)
+        problem = GenKillProblem(gen, kill, self.accesses.parameter_definitions)
+        self.ins, self.outs = solve(cfg, problem)
+
+    def apply(self, entry, gen, kill):
+        accesses = self.accesses
+        for definition in accesses.entry_definitions[entry]:
+            if accesses.may_definitions >> definition & 1:
+                gen |= 1 << definition
+                continue
+            others = accesses.variable_definitions[accesses.definition_variables[definition]]
+            gen = (gen & ~others) | (1 << definition)
+            kill |= others
+        return gen, kill
+
+    def reaching(self, node):
+        # Definitions reaching the block entry that contains node, before it.
+        cfg = self.accesses.cfg
+        position = cfg.position_of(node)
+        if position is None:
+            return []
+        block = cfg.block_at(position)
+        value = self.ins[block]
+        for entry in range(cfg.block_starts[block], position):
+            gen, kill = self.apply(entry, 0, 0)
+            value = gen | (value & ~kill)
+        definitions = self.accesses.definitions
+        return [definitions[x] for x in iter_bits(value)]
+
+class Liveness(object):
+    def __init__(self, cfg, accesses=None):
+        self.accesses = accesses or FunctionAccesses(cfg)
+        gen = []
+        kill = []
+        for block in range(cfg.block_count):
+            block_gen, block_kill = 0, 0
+            for entry in reversed(self.accesses.entry_range(block)):
+                defined = self.accesses.killed_variables_bits(entry)
+                block_gen = self.accesses.used_variables_bits(entry) | (block_gen & ~defined)
+                block_kill |= defined
+            gen.append(block_gen)
+            kill.append(block_kill)
+        problem = GenKillProblem(gen, kill, forward=False)
+        # For a backward problem solve() returns the values after each
+        # block first.
+        self.live_out, self.live_in = solve(cfg, problem)
+
+    def live_variables(self, bits):
+        variables = self.accesses.variables
+        return [variables[x] for x in iter_bits(bits)]
+
+def _tracks_initialization(decl):
+    if isinstance(decl, cn.ParmDeclNode):
+        return False
+    if decl.is_global or decl.storage_class in ("STATIC", "EXTERN"):
+        return False
+    # Elements and members are written without a reference to the whole
+    # variable being a definition.
+    type_name = decl.type.canonical_type_name
+    return "[" not in type_name and not type_name.startswith(("struct ", "union "))
+
+def uninitialized_uses(cfg, accesses=None):
+    accesses = accesses or FunctionAccesses(cfg)
+    tracked = 0
+    for index, decl in enumerate(accesses.variables):
+        if _tracks_initialization(decl):
+            tracked |= 1 << index
+
+    def apply(entry, value):
+        for variable in accesses.entry_declarations[entry]:
+            value |= 1 << variable
+        return value & ~accesses.defined_variables_bits(entry) & tracked
+
+    gen = []
+    kill = []
+    for block in range(cfg.block_count):
+        block_gen, block_kill = 0, 0
+        for entry in accesses.entry_range(block):
+            declared = 0
+            for variable in accesses.entry_declarations[entry]:
+                declared |= 1 << variable
+            defined = accesses.defined_variables_bits(entry)
+            block_gen = ((block_gen | declared) & ~defined) & tracked
+            block_kill |= defined
+        gen.append(block_gen)
+        kill.append(block_kill)
+    ins, outs = solve(cfg, GenKillProblem(gen, kill))
+
+    result = []
+    reachable = cfg.reachable()
+    for block in range(cfg.block_count):
+        if not reachable[block]:
+            continue
+        value = ins[block]
+        for entry in accesses.entry_range(block):
+            for variable, node in accesses.entry_uses[entry]:
+                if value >> variable & 1:
+                    result.append(node)
+            value = apply(entry, value)
+    return result
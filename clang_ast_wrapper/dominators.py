@@ -0,0 +1,153 @@
+# coding: utf-8
+
+"""
+Dominator and post-dominator trees of control-flow graphs.
+
+Immediate dominators are computed with the iterative algorithm of Cooper,
+Harvey and Kennedy ("A Simple, Fast Dominance Algorithm") over the CSR
+arrays of ControlFlowGraph. The tree is then numbered in preorder and
+postorder, so that dominates(a, b) is two array comparisons.
+
+Blocks not reachable from the root (the entry, or the exit for
+post-dominators) have no immediate dominator and dominate nothing.
+"""
+
+import array
+
+from clang_ast_wrapper.cfg import ENTRY, EXIT
+
+def _postorder(root, block_count, starts, blocks):
+    order = array.array("l")
+    visited = bytearray(block_count)
+    visited[root] = 1
+    stack = [(root, starts[root])]
+    while stack:
+        block, index = stack[-1]
+        if index < starts[block + 1]:
+            stack[-1] = (block, index + 1)
+            successor = blocks[index]
+            if not visited[successor]:
+                visited[successor] = 1
+                stack.append((successor, starts[successor]))
+        else:
+            stack.pop()
+            order.append(block)
+    return order
+
+def immediate_dominators(root, block_count, succ_starts, succ_blocks, pred_starts, pred_blocks):
+    postorder = _postorder(root, block_count, succ_starts, succ_blocks)
+    numbers = array.array("l", [-1]) * block_count
+    for number, block in enumerate(postorder):
+        numbers[block] = number
+    idom = array.array("l", [-1]) * block_count
+    idom[root] = root
+    reverse_postorder = postorder[::-1][1:]
+    changed = True
+    while changed:
+        changed = False
+        for block in reverse_postorder:
+            new_idom = -1
+            for index in range(pred_starts[block], pred_starts[block + 1]):
+                pred = pred_blocks[index]
+                if idom[pred] < 0:
+                    continue
+                if new_idom < 0:
+                    new_idom = pred
+                    continue
+                # intersect
+                finger1 = pred
+                finger2 = new_idom
+                while finger1 != finger2:
+                    while numbers[finger1] < numbers[finger2]:
+                        finger1 = idom[finger1]
+                    while numbers[finger2] < numbers[finger1]:
+                        finger2 = idom[finger2]
+                new_idom = finger1
+            if idom[block] != new_idom:
+                idom[block] = new_idom
+                changed = True
+    return idom
+
+class DominatorTree(object):
+    def __init__(self, cfg, root, idom, post=False):
+        self.cfg = cfg
+        self.root = root
+        self.idom = idom
+        self.post = post
+        block_count = len(idom)
+
+        child_lists = [[] for _ in range(block_count)]
+        for block in range(block_count):
+            parent = idom[block]
+            if parent >= 0 and block != root:
+                child_lists[parent].append(block)
+        self.child_starts = array.array("l", [0])
+        self.child_blocks = array.array("l")
+        for children in child_lists:
+            self.child_blocks.extend(children)
+            self.child_starts.append(len(self.child_blocks))
+
+        self.preorder = array.array("l", [-1]) * block_count
+        self.postorder = array.array("l", [-1]) * block_count
+        pre = 0
+        post_number = 0
+        self.preorder[root] = pre
+        pre += 1
+        stack = [(root, self.child_starts[root])]
+        while stack:
+            block, index = stack[-1]
+            if index < self.child_starts[block + 1]:
+                stack[-1] = (block, index + 1)
+                child = self.child_blocks[index]
+                self.preorder[child] = pre
+                pre += 1
+                stack.append((child, self.child_starts[child]))
+            else:
+                stack.pop()
+                self.postorder[block] = post_number
+                post_number += 1
+
+    def __repr__(self):
+        return "%s: %s" % (type(self).__name__, "post" if self.post else "pre")
+
+    def immediate_dominator(self, block):
+        idom = self.idom[block]
+        if idom < 0 or block == self.root:
+            return None
+        return idom
+
+    def children(self, block):
+        return self.child_blocks[self.child_starts[block]:self.child_starts[block + 1]]
+
+    def dominates(self, a, b):
+        preorder = self.preorder
+        if preorder[a] < 0 or preorder[b] < 0:
+            return False
+        return preorder[a] <= preorder[b] and self.postorder[b] <= self.postorder[a]
+
+    def strictly_dominates(self, a, b):
+        return a != b and self.dominates(a, b)
+
+    def dominates_node(self, a, b):
+        # Nodes of one block entry (a statement or a branch condition) are
+        # treated as evaluated together.
+        cfg = self.cfg
+        position_a = cfg.position_of(a)
+        position_b = cfg.position_of(b)
+        if position_a is None or position_b is None:
+            return False
+        block_a = cfg.block_at(position_a)
+        block_b = cfg.block_at(position_b)
+        if block_a == block_b:
+            if self.post:
+                return position_a >= position_b and self.dominates(block_a, block_b)
+            return position_a <= position_b and self.dominates(block_a, block_b)
+        return self.dominates(block_a, block_b)
+
+def dominator_tree(cfg):
+    idom = immediate_dominators(ENTRY, cfg.block_count, cfg.succ_starts, cfg.succ_blocks, cfg.pred_starts, cfg.pred_blocks)
+    return DominatorTree(cfg, ENTRY, idom)
+
+def post_dominator_tree(cfg):
+    idom = immediate_dominators(EXIT, cfg.block_count, cfg.pred_starts, cfg.pred_blocks, cfg.succ_starts, cfg.succ_blocks)
+    return DominatorTree(cfg, EXIT, idom, post=True)
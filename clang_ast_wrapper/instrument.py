@@ -0,0 +1,148 @@
+# coding: utf-8
+
+"""
+Opt-in instrumentation of libclang calls and node construction.
+
+    profiler = Profiler()
+    with profiler:
+        root = TranslationUnitNode(tu.cursor)
+    print(profiler.format_table())
+
+    python -m clang_ast_wrapper.instrument [--json] [--limit N] FILE [CLANG_ARGS...]
+
+Times are inclusive: clang_visitChildren contains the Python callbacks it
+runs, and a node kind contains the construction of its children. The
+"self" column of a node kind excludes nested create_node calls.
+"""
+
+import argparse
+import json
+import sys
+import timeit
+
+import clang.cindex
+import clang_ast_wrapper.node as cn
+
+_clock = timeit.default_timer
+
+class _InstrumentedLibrary(object):
+    def __init__(self, lib, profiler):
+        self._lib = lib
+        self._profiler = profiler
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        func = getattr(self._lib, name)
+        if callable(func):
+            func = self._profiler.wrap_function(name, func)
+        setattr(self, name, func)
+        return func
+
+class Profiler(object):
+    def __init__(self):
+        self.functions = {}
+        self.kinds = {}
+        self.lib = None
+        self.create_node = None
+
+    def wrap_function(self, name, func):
+        stats = self.functions.setdefault(name, [0, 0.0])
+
+        def wrapper(*args):
+            start = _clock()
+            try:
+                return func(*args)
+            finally:
+                stats[0] += 1
+                stats[1] += _clock() - start
+        return wrapper
+
+    def wrap_create_node(self, create_node):
+        kinds = self.kinds
+        nested_times = [0.0]
+
+        def wrapper(cursor, tu):
+            kind = clang.cindex.CursorKind.name_of(cursor._kind_id)
+            nested_times.append(0.0)
+            start = _clock()
+            try:
+                return create_node(cursor, tu)
+            finally:
+                elapsed = _clock() - start
+                nested = nested_times.pop()
+                nested_times[-1] += elapsed
+                stats = kinds.get(kind)
+                if stats is None:
+                    stats = kinds[kind] = [0, 0.0, 0.0]
+                stats[0] += 1
+                stats[1] += elapsed
+                stats[2] += elapsed - nested
+        return wrapper
+
+    def enable(self):
+        if self.lib is not None:
+            raise RuntimeError("Profiler is already enabled.")
+        conf = clang.cindex.conf
+        self.lib = conf.lib
+        conf.lib = _InstrumentedLibrary(self.lib, self)
+        self.create_node = cn.Node.__dict__["create_node"]
+        cn.Node.create_node = staticmethod(self.wrap_create_node(self.create_node.__func__))
+
+    def disable(self):
+        if self.lib is None:
+            return
+        clang.cindex.conf.lib = self.lib
+        cn.Node.create_node = self.create_node
+        self.lib = self.create_node = None
+
+    def __enter__(self):
+        self.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.disable()
+
+    def as_dict(self):
+        return {
+            "functions": dict((name, {"calls": calls, "time": time}) for name, (calls, time) in self.functions.items()),
+            "kinds": dict((kind, {"count": count, "time": time, "self_time": self_time})
+                          for kind, (count, time, self_time) in self.kinds.items()),
+        }
+
+    def to_json(self):
+        return json.dumps(self.as_dict(), indent=2, sort_keys=True)
+
+    def format_table(self, limit=None):
+        lines = ["%-40s %10s %12s" % ("libclang function", "calls", "time [s]")]
+        functions = sorted(self.functions.items(), key=lambda x: -x[1][1])
+        for name, (calls, time) in functions[:limit]:
+            lines.append("%-40s %10d %12.6f" % (name, calls, time))
+        lines.append("")
+        lines.append("%-40s %10s %12s %12s" % ("node kind", "count", "time [s]", "self [s]"))
+        kinds = sorted(self.kinds.items(), key=lambda x: -x[1][2])
+        for kind, (count, time, self_time) in kinds[:limit]:
+            lines.append("%-40s %10d %12.6f %12.6f" % (kind, count, time, self_time))
+        return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Profile libclang calls and node construction of a source file.")
+    parser.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    parser.add_argument("--limit", type=int, default=None, help="rows per table")
+    parser.add_argument("source")
+    parser.add_argument("clang_args", nargs=argparse.REMAINDER)
+    args = parser.parse_args(argv)
+
+    profiler = Profiler()
+    with profiler:
+        index = clang.cindex.Index.create()
+        tu = index.parse(args.source, args=args.clang_args)
+        cn.TranslationUnitNode(tu.cursor)
+    if args.json:
+        print(profiler.to_json())
+    else:
+        print(profiler.format_table(args.limit))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
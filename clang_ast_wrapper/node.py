@@ -17,14 +17,55 @@ UNEXPOSED_EXPR
 VAR_DECL
 """
 
+import array
+import bisect
+import heapq
 import re
 
+import clang.cindex
+from clang.cindex import CursorKind, StorageClass
+from clang_ast_wrapper.cache import CursorCache, cursor_key
+
 _debug = True
 
+_INTEGER_SUFFIX = re.compile(r"[uUlL]+$")
+_OCTAL_LITERAL = re.compile(r"0[0-7]+$")
+
+def parse_integer_literal(literal):
+    if literal[-1] in "uUlL":
+        literal = _INTEGER_SUFFIX.sub("", literal)
+    if _OCTAL_LITERAL.match(literal):
+        return int(literal, 8)
+    return int(literal, 0)
+
 class VarType(object):
-    def __init__(self, var_type):
-        self.type_name = var_type.spelling
-        self.canonical_type_name = var_type.get_canonical().spelling
+    def __init__(self, type_name, canonical_type_name, size=None, align=None):
+        self.type_name = type_name
+        self.canonical_type_name = canonical_type_name
+        self.size = size
+        self.align = align
+
+def decl_key(cursor):
+    # The Decl pointer. clang_equalCursors ignores the other data of a
+    # declaration cursor, which differs between a declarator visited as a
+    # child and the same declaration returned by cursor.referenced.
+    return cursor.data[0]
+
+def node_key(cursor):
+    # What clang_hashCursor reads, without the round trip: the Stmt of a
+    # statement or expression, the entity and location of a reference,
+    # otherwise the entity. Parents recorded in the other fields differ
+    # between the AST walk and annotate_tokens.
+    kind_id = cursor._kind_id
+    data = cursor.data
+    if 100 <= kind_id < 300:
+        return kind_id, data[1]
+    if 40 <= kind_id < 100:
+        return kind_id, data[0], data[1]
+    return kind_id, data[0]
+
+def type_property(type_id_name):
+    return property(lambda self: self.tu.types[getattr(self, type_id_name)])
 
 class NodeException(Exception):
     pass
@@ -37,26 +78,74 @@ class Node(object):
             self.cursor = None
 
         self.tu = tu
-        self.kind = cursor.kind.name
+        self.kind_id = cursor._kind_id
+        self.node_id = tu.add_node(self, cursor)
         self.parent = None
         self.children = ()
-        self.offset = cursor.location.offset
+        self.file_id, self.offset = tu.decode_location(cursor.location)
+        self.extent_offsets = None
+
+    def get_extent_offsets(self):
+        # [start_offset, end_offset) in the file of the location, decoded on
+        # first use. Extents reaching into another file are cut to the
+        # location.
+        offsets = self.extent_offsets
+        if offsets is None:
+            tu = self.tu
+            (start_file_id, start), (end_file_id, end) = tu.decode_extent(tu.cursor_cache.extent(tu.node_cursors[self.node_id]))
+            if start_file_id != self.file_id:
+                start = end = self.offset
+            elif end_file_id != self.file_id or end < start:
+                end = start
+            offsets = self.extent_offsets = (start, end)
+        return offsets
+
+    @property
+    def start_offset(self):
+        return self.get_extent_offsets()[0]
+
+    @property
+    def end_offset(self):
+        return self.get_extent_offsets()[1]
 
     def set_parent(self, parent):
         self.parent = parent
 
+    def constant_value(self):
+        return self.tu.evaluate_constant(self)
+
+    def is_constant_value(self):
+        return self.tu.evaluate_constant(self) is not None
+
     def set_children(self, children):
         self.children = children
         for child in children:
             child.set_parent(self)
 
     def create_children_nodes(self, cursor, expected_count=None):
-        children = tuple(Node.create_node(x, self.tu) for x in cursor.get_children())
+        tu = self.tu
+        children = tuple(Node.create_node(x, tu) for x in tu.cursor_cache.children(cursor) if tu.claim_tag_decl(x))
         if expected_count is not None and len(children) != expected_count:
             raise NodeException("%s should have %d children." % (type(self).__name__, expected_count))
         self.set_children(children)
         return children
 
+    @property
+    def kind(self):
+        return CursorKind.name_of(self.kind_id)
+
+    @property
+    def file_name(self):
+        return self.tu.file_names[self.file_id]
+
+    @property
+    def line(self):
+        return self.tu.get_line_column(self.file_id, self.offset)[0]
+
+    @property
+    def column(self):
+        return self.tu.get_line_column(self.file_id, self.offset)[1]
+
     def __repr__(self):
         if self.cursor:
             return "Node: %s (%s)" % (self.kind, " ".join(x.spelling for x in self.cursor.get_tokens()))
@@ -65,65 +154,73 @@ class Node(object):
 
     @staticmethod
     def create_node(cursor, tu):
-        kind = cursor.kind.name
-        if kind == "UNARY_OPERATOR":
-            return UnaryOperatorNode(cursor, tu)
-        elif kind == "BINARY_OPERATOR":
-            return BinaryOperatorNode(cursor, tu)
-        elif kind == "VAR_DECL":
-            return VarDeclNode(cursor, tu)
-        elif kind == "CSTYLE_CAST_EXPR":
-            return CStyleCastExprNode(cursor, tu)
-        elif kind == "CALL_EXPR":
-            return CallExprNode(cursor, tu)
-        elif kind == "DECL_STMT":
-            return DeclStmtNode(cursor, tu)
-        elif kind == "FUNCTION_DECL":
-            return FunctionDeclNode(cursor, tu)
-        elif kind == "FOR_STMT":
-            return ForStmtNode(cursor, tu)
-        elif kind == "IF_STMT":
-            return IfStmtNode(cursor, tu)
-        elif kind == "CONDITIONAL_OPERATOR":
-            return ConditionalOperatorNode(cursor, tu)
-        elif kind == "DECL_REF_EXPR":
-            return DeclRefExprNode(cursor, tu)
-        elif kind == "STRING_LITERAL":
-            return StringLiteralNode(cursor, tu)
-        elif kind == "INTEGER_LITERAL":
-            return IntegerLiteralNode(cursor, tu)
-        elif kind == "RETURN_STMT":
-            return ReturnStmtNode(cursor, tu)
-        elif kind == "PARM_DECL":
-            return ParmDeclNode(cursor, tu)
-        elif kind == "MEMBER_REF_EXPR":
-            return MemberRefExprNode(cursor, tu)
-        elif kind in {"PAREN_EXPR", "UNEXPOSED_EXPR"}:
-            children = tuple(x for x in cursor.get_children())
+        kind_id = cursor._kind_id
+        node_class = _node_classes.get(kind_id)
+        if node_class is not None:
+            return node_class(cursor, tu)
+        elif kind_id in _transparent_kind_ids:
+            children = tu.cursor_cache.children(cursor)
             if len(children) != 1:
+                tokens = tu.get_token_spellings(cursor)
+                if children and tokens and tokens[0] in (".", "["):
+                    return DesignatedInitExprNode(cursor, tu)
                 raise NodeException("PAREN_EXPR/UNEXPOSED_EXPR should have a single child.")
-            return Node.create_node(children[0], tu)
-        elif kind == "COMPOUND_STMT":
-            return CompoundStmtNode(cursor, tu)
+            node = Node.create_node(children[0], tu)
+            tu.add_cursor(cursor, node)
+            return node
         else:
             # raise NodeException("Unknown kind: %s" % kind)
             node = Node(cursor, tu)
             node.create_children_nodes(cursor)
             return node
 
+class DeclNode(Node):
+    def __init__(self, cursor, tu):
+        super(DeclNode, self).__init__(cursor, tu)
+        self.name = cursor.spelling
+        self.usr = cursor.get_usr()
+        self.decl_key = decl_key(cursor)
+        self.referrer_ids = array.array("l")
+        tu.add_decl(self)
+
+    @property
+    def referrers(self):
+        return list(self.iter_referrers())
+
+    @property
+    def referrer_count(self):
+        return len(self.referrer_ids)
+
+    def iter_referrers(self):
+        nodes = self.tu.nodes
+        return (nodes[x] for x in self.referrer_ids)
+
+    def add_referrer(self, referrer):
+        self.referrer_ids.append(referrer.node_id)
+
 class DeclRefExprNode(Node):
+    type = type_property("type_id")
+
     def __init__(self, cursor, tu):
         super(DeclRefExprNode, self).__init__(cursor, tu)
         self.create_children_nodes(cursor, 0)
         self.name = cursor.spelling
-        self.type = VarType(cursor.type)
+        self.type_id = tu.get_type_id(cursor.type)
+        self.decl = None
+        self.var_decl = None
 
-        if cursor.get_definition():
-            self.var_decl = tu.find_var_decl(cursor.get_definition().location.offset)
-            if self.var_decl:
-                self.var_decl.add_referrer(self)
+        definition = tu.cursor_cache.definition(cursor)
+        if definition:
+            tu.add_decl_ref(self, decl_key(definition), None)
         else:
-            self.var_decl = None
+            referenced = cursor.referenced
+            if referenced:
+                tu.add_decl_ref(self, None, referenced.get_usr())
+
+    def set_decl(self, decl):
+        self.decl = decl
+        if isinstance(decl, VarDeclNode):
+            self.var_decl = decl
 
     def __repr__(self):
         return "%s: %s::%s" % (type(self).__name__, self.name, self.type.type_name)
@@ -138,38 +235,53 @@ class DeclStmtNode(Node):
     def __repr__(self):
         return "%s" % type(self).__name__
 
-class VarDeclNode(Node):
+class VarDeclNode(DeclNode):
+    type = type_property("type_id")
+
     def __init__(self, cursor, tu):
         super(VarDeclNode, self).__init__(cursor, tu)
-        tu.add_var_decl_info(cursor.location.offset, self)
-        self.referrers = []
         children = self.create_children_nodes(cursor)
-        self.name = cursor.spelling
-        self.type = VarType(cursor.type)
-        if "=" in (x.spelling for x in cursor.get_tokens()):
-            self.initial_value = children[-1]
-        else:
-            self.initial_value = None
+        self.type_id = tu.get_type_id(cursor.type)
+        # The initializer is the last child, after a "=". The extent of
+        # "int a = 1, b;" and of "struct S { ... } s" also covers tokens
+        # of other declarators and of the tag body.
+        self.initial_value = None
+        raw_children = [x for x in tu.cursor_cache.children(cursor) if x._kind_id not in _tag_decl_kind_ids]
+        if raw_children and children:
+            file_id, offset = tu.decode_location(tu.cursor_cache.extent(raw_children[-1]).start)
+            if tu.find_token_before(file_id, offset, tu.cursor_cache.extent(cursor)) == "=":
+                self.initial_value = children[-1]
         self.is_global = False
-        self.storage_class = cursor.storage_class.name
+        self.storage_class_id = cursor.storage_class.value
+
+    @property
+    def storage_class(self):
+        return StorageClass.name_of(self.storage_class_id)
 
     def __repr__(self):
         return "%s: %s::%s" % (type(self).__name__, self.name, self.type.type_name)
 
-    def add_referrer(self, referrer):
-        self.referrers.append(referrer)
-
     def set_global(self, flag):
         self.is_global = flag
 
 class MemberRefExprNode(Node):
+    type = type_property("type_id")
+
     def __init__(self, cursor, tu):
         super(MemberRefExprNode, self).__init__(cursor, tu)
         children = self.create_children_nodes(cursor, 1)
         self.name = cursor.spelling
-        self.type = VarType(next(cursor.get_children()).type)
-        self.operator = tuple(x for x in cursor.get_tokens())[-2].spelling
+        self.type_id = tu.get_type_id(tu.cursor_cache.type(tu.cursor_cache.children(cursor)[0]))
+        self.operator = tu.get_token_spellings(cursor)[-2]
         self.operand = children[0]
+        self.decl = None
+
+        referenced = cursor.referenced
+        if referenced:
+            tu.add_decl_ref(self, decl_key(referenced), referenced.get_usr())
+
+    def set_decl(self, decl):
+        self.decl = decl
 
     def __repr__(self):
         return "%s: %s" % (type(self).__name__, self.name)
@@ -184,8 +296,7 @@ class ForStmtNode(Node):
         index = 0
         state = "initial"
         self.init = self.condition = self.increment = None
-        for token_obj in cursor.get_tokens():
-            token = token_obj.spelling
+        for token in tu.get_token_spellings(cursor):
             if state == "initial":
                 if token == "for":
                     state = "after_for"
@@ -236,6 +347,94 @@ class IfStmtNode(Node):
     def __repr__(self):
         return "%s" % (type(self).__name__,)
 
+class WhileStmtNode(Node):
+    def __init__(self, cursor, tu):
+        super(WhileStmtNode, self).__init__(cursor, tu)
+        children = self.create_children_nodes(cursor, 2)
+        self.condition = children[0]
+        self.body = children[1]
+
+    def __repr__(self):
+        return "%s" % (type(self).__name__,)
+
+class DoStmtNode(Node):
+    def __init__(self, cursor, tu):
+        super(DoStmtNode, self).__init__(cursor, tu)
+        children = self.create_children_nodes(cursor, 2)
+        self.body = children[0]
+        self.condition = children[1]
+
+    def __repr__(self):
+        return "%s" % (type(self).__name__,)
+
+class SwitchStmtNode(Node):
+    def __init__(self, cursor, tu):
+        super(SwitchStmtNode, self).__init__(cursor, tu)
+        children = self.create_children_nodes(cursor, 2)
+        self.condition = children[0]
+        self.body = children[1]
+
+    def __repr__(self):
+        return "%s" % (type(self).__name__,)
+
+class CaseStmtNode(Node):
+    def __init__(self, cursor, tu):
+        super(CaseStmtNode, self).__init__(cursor, tu)
+        children = self.create_children_nodes(cursor)
+        if len(children) not in (2, 3):
+            raise NodeException("Invalid case statement.")
+        # A GNU case range "case 1 ... 3:" has both bounds.
+        self.value = children[0]
+        self.last_value = children[1] if len(children) == 3 else None
+        self.body = children[-1]
+
+    def __repr__(self):
+        return "%s" % (type(self).__name__,)
+
+class DefaultStmtNode(Node):
+    def __init__(self, cursor, tu):
+        super(DefaultStmtNode, self).__init__(cursor, tu)
+        children = self.create_children_nodes(cursor, 1)
+        self.body = children[0]
+
+    def __repr__(self):
+        return "%s" % (type(self).__name__,)
+
+class BreakStmtNode(Node):
+    def __init__(self, cursor, tu):
+        super(BreakStmtNode, self).__init__(cursor, tu)
+        self.create_children_nodes(cursor, 0)
+
+    def __repr__(self):
+        return "%s" % (type(self).__name__,)
+
+class ContinueStmtNode(Node):
+    def __init__(self, cursor, tu):
+        super(ContinueStmtNode, self).__init__(cursor, tu)
+        self.create_children_nodes(cursor, 0)
+
+    def __repr__(self):
+        return "%s" % (type(self).__name__,)
+
+class GotoStmtNode(Node):
+    def __init__(self, cursor, tu):
+        super(GotoStmtNode, self).__init__(cursor, tu)
+        self.create_children_nodes(cursor, 1)
+        self.label = tu.cursor_cache.children(cursor)[0].spelling
+
+    def __repr__(self):
+        return "%s: %s" % (type(self).__name__, self.label)
+
+class LabelStmtNode(Node):
+    def __init__(self, cursor, tu):
+        super(LabelStmtNode, self).__init__(cursor, tu)
+        children = self.create_children_nodes(cursor, 1)
+        self.label = cursor.spelling
+        self.body = children[0]
+
+    def __repr__(self):
+        return "%s: %s" % (type(self).__name__, self.label)
+
 class ReturnStmtNode(Node):
     def __init__(self, cursor, tu):
         super(ReturnStmtNode, self).__init__(cursor, tu)
@@ -249,13 +448,15 @@ class ReturnStmtNode(Node):
         return "%s" % (type(self).__name__, )
 
 class CStyleCastExprNode(Node):
+    cast_type = type_property("cast_type_id")
+
     def __init__(self, cursor, tu):
         super(CStyleCastExprNode, self).__init__(cursor, tu)
-        self.cast_type = VarType(cursor.type)
-        children = tuple(x for x in cursor.get_children())
+        self.cast_type_id = tu.get_type_id(cursor.type)
+        children = tu.cursor_cache.children(cursor)
         if len(children) == 1:
             self.child = Node.create_node(children[0], tu)
-        elif len(children) == 2 and children[0].kind.name == "TYPE_REF":
+        elif len(children) == 2 and children[0]._kind_id == CursorKind.TYPE_REF.value:
             self.child = Node.create_node(children[1], tu)
         else:
             raise NodeException("CStyleCastExpr can have a single child.")
@@ -265,22 +466,41 @@ class CStyleCastExprNode(Node):
         return "%s: %s" % (type(self).__name__, self.cast_type.type_name)
 
 class UnaryOperatorNode(Node):
+    type = type_property("type_id")
+
     def __init__(self, cursor, tu):
         super(UnaryOperatorNode, self).__init__(cursor, tu)
         children = self.create_children_nodes(cursor, 1)
-        self.operator = next(cursor.get_tokens()).spelling
+        self.type_id = tu.get_type_id(cursor.type)
         self.operand = children[0]
+        # Only the operand of a postfix operator starts where the operator
+        # expression does. The raw operand keeps its parentheses.
+        tokens = tu.get_token_spellings(cursor)
+        raw_operand = tu.cursor_cache.children(cursor)[0]
+        self.is_postfix = (tokens[-1] in ("++", "--") and
+                           tu.cursor_cache.extent(raw_operand).begin_int_data == tu.cursor_cache.extent(cursor).begin_int_data)
+        self.operator = tokens[-1] if self.is_postfix else tokens[0]
 
     def __repr__(self):
         return "%s: %s" % (type(self).__name__, self.operator)
 
 class BinaryOperatorNode(Node):
+    type = type_property("type_id")
+
+    @property
+    def operand_types(self):
+        # Operand types after the implicit conversions, such as the usual
+        # arithmetic conversions.
+        return tuple(self.tu.types[x] for x in self.operand_type_ids)
+
     def __init__(self, cursor, tu):
         super(BinaryOperatorNode, self).__init__(cursor, tu)
         children = self.create_children_nodes(cursor, 2)
-        raw_children = tuple(x for x in cursor.get_children())
-        tokens = tuple(x.spelling for x in cursor.get_tokens())
-        token_len = tuple(sum(1 for x in child.get_tokens()) for child in raw_children)
+        self.type_id = tu.get_type_id(cursor.type)
+        raw_children = tu.cursor_cache.children(cursor)
+        self.operand_type_ids = tuple(tu.get_type_id(tu.cursor_cache.type(x)) for x in raw_children)
+        tokens = tu.get_token_spellings(cursor)
+        token_len = tuple(len(tu.get_token_spellings(child)) for child in raw_children)
         if len(tokens) != token_len[0] + 1 + token_len[1]:
             raise NodeException("Tokens length is invalid.")
         self.operator = tokens[token_len[0]]
@@ -289,13 +509,19 @@ class BinaryOperatorNode(Node):
     def __repr__(self):
         return "%s: %s" % (type(self).__name__, self.operator)
 
+class CompoundAssignmentOperatorNode(BinaryOperatorNode):
+    pass
+
 class ConditionalOperatorNode(Node):
+    type = type_property("type_id")
+
     def __init__(self, cursor, tu):
         super(ConditionalOperatorNode, self).__init__(cursor, tu)
         children = self.create_children_nodes(cursor, 3)
-        raw_children = tuple(x for x in cursor.get_children())
-        tokens = tuple(x.spelling for x in cursor.get_tokens())
-        token_len = tuple(sum(1 for x in child.get_tokens()) for child in raw_children)
+        self.type_id = tu.get_type_id(cursor.type)
+        raw_children = tu.cursor_cache.children(cursor)
+        tokens = tu.get_token_spellings(cursor)
+        token_len = tuple(len(tu.get_token_spellings(child)) for child in raw_children)
         if len(tokens) != token_len[0] + 1 + token_len[1] + 1 + token_len[2]:
             raise NodeException("Tokens length is invalid.")
         self.operator = "?:"
@@ -304,14 +530,83 @@ class ConditionalOperatorNode(Node):
     def __repr__(self):
         return "%s: %s" % (type(self).__name__, self.operator)
 
+class UnaryExprNode(Node):
+    def __init__(self, cursor, tu):
+        super(UnaryExprNode, self).__init__(cursor, tu)
+        self.create_children_nodes(cursor)
+        self.operator = tu.get_token_spellings(cursor)[0]
+        self.value = cursor.evaluate_integer()
+        if self.value is None:
+            self.value = self.evaluate_operand_type(cursor)
+
+    def evaluate_operand_type(self, cursor):
+        # Without clang_Cursor_Evaluate the size is read from the operand:
+        # an expression, a TYPE_REF for a named type, or a builtin type seen
+        # elsewhere in the translation unit. libclang does not expose other
+        # type operands, such as char[16] or int *.
+        tu = self.tu
+        is_align = "align" in self.operator.lower()
+        operand = list(tu.get_token_spellings(cursor)[1:])
+        if operand[:1] == ["("] and operand[-1:] == [")"]:
+            operand = operand[1:-1]
+        children = tu.cursor_cache.children(cursor)
+        if len(children) == 1:
+            child = children[0]
+            child_tokens = list(tu.get_token_spellings(child))
+            words = [x for x in operand if x not in _TYPE_QUALIFIER_WORDS]
+            if words in (child_tokens, ["("] + child_tokens + [")"]) or (
+                    child._kind_id == CursorKind.TYPE_REF.value and words[1:] == child_tokens and words[0] in _TAG_WORDS):
+                operand_type = tu.cursor_cache.type(child)
+                value = operand_type.get_align() if is_align else operand_type.get_size()
+                return value if value >= 0 else None
+            return None
+        if children:
+            return None
+        name = _builtin_type_name(operand)
+        for var_type in tu.types:
+            if var_type.canonical_type_name == name:
+                return var_type.align if is_align else var_type.size
+        return None
+
+    def __repr__(self):
+        return "%s: %s" % (type(self).__name__, self.operator)
+
+class InitListExprNode(Node):
+    type = type_property("type_id")
+
+    def __init__(self, cursor, tu):
+        super(InitListExprNode, self).__init__(cursor, tu)
+        self.create_children_nodes(cursor)
+        self.type_id = tu.get_type_id(cursor.type)
+
+    def __repr__(self):
+        return "%s: %s" % (type(self).__name__, self.type.type_name)
+
+class DesignatedInitExprNode(Node):
+    def __init__(self, cursor, tu):
+        super(DesignatedInitExprNode, self).__init__(cursor, tu)
+        children = self.create_children_nodes(cursor)
+        # ".a.b = x" has a MEMBER_REF per field. "[i] = x" and the GNU
+        # "[i ... j] = x" have their index expressions instead.
+        self.field_names = tuple(x.spelling for x in tu.cursor_cache.children(cursor)[:-1] if x._kind_id == CursorKind.MEMBER_REF.value)
+        self.indices = tuple(x for x in children[:-1] if x.kind_id != CursorKind.MEMBER_REF.value)
+        self.value = children[-1]
+
+    def __repr__(self):
+        return "%s" % (type(self).__name__, )
+
 class StringLiteralNode(Node):
     def __init__(self, cursor, tu):
         super(StringLiteralNode, self).__init__(cursor, tu)
         self.create_children_nodes(cursor, 0)
-        tokens = tuple(x.spelling for x in cursor.get_tokens())
-        if len(tokens) != 1:
-            raise NodeException("literal should have a single token.")
-        self.literal = tokens[0]
+        # Adjacent literals are concatenated in the cursor spelling, so a
+        # mismatch means the literal is not a single token.
+        self.literal = tu.find_token(self.file_id, self.offset)
+        if self.literal is None or self.literal != cursor.spelling:
+            tokens = tu.get_token_spellings(cursor)
+            if len(tokens) != 1:
+                raise NodeException("literal should have a single token.")
+            self.literal = tokens[0]
 
     def __repr__(self):
         return "%s: %s" % (type(self).__name__, self.literal)
@@ -320,28 +615,177 @@ class IntegerLiteralNode(Node):
     def __init__(self, cursor, tu):
         super(IntegerLiteralNode, self).__init__(cursor, tu)
         self.create_children_nodes(cursor, 0)
-        tokens = tuple(x.spelling for x in cursor.get_tokens())
-        if len(tokens) != 1:
-            raise NodeException("literal should have a single token.")
-        match_data = re.search(r"^(.+?)[uUlL]+", tokens[0])
-        if match_data:
-            self.literal = int(match_data.group(1), 0)
-        else:
-            self.literal = int(tokens[0], 0)
+        self.literal = cursor.evaluate_integer()
+        if self.literal is None:
+            token = tu.find_token(self.file_id, self.offset)
+            if token is None:
+                tokens = tu.get_token_spellings(cursor)
+                if len(tokens) != 1:
+                    raise NodeException("literal should have a single token.")
+                token = tokens[0]
+            self.literal = parse_integer_literal(token)
 
     def __repr__(self):
         return "%s: %s" % (type(self).__name__, self.literal)
 
+class Scope(object):
+    def __init__(self, parent, node, ordered=True):
+        self.parent = parent
+        self.node = node
+        # Declarations of a block scope are added in node id order, which is
+        # source order. File scope is built in several passes and keeps no
+        # order.
+        self.ordered = ordered
+        self.names = {}
+        self.children = []
+        if parent is not None:
+            parent.children.append(self)
+
+    def __repr__(self):
+        return "%s: %r" % (type(self).__name__, self.node)
+
+    def add(self, decl):
+        decls = self.names.get(decl.name)
+        if decls is None:
+            self.names[decl.name] = [decl]
+        else:
+            decls.append(decl)
+
+    def lookup_local(self, name, before=None):
+        decls = self.names.get(name)
+        if not decls:
+            return None
+        if before is None or not self.ordered:
+            return decls[-1] if self.ordered else decls[0]
+        for decl in reversed(decls):
+            if decl.node_id <= before.node_id:
+                return decl
+        return None
+
+    def lookup(self, name, before=None):
+        # With before, only declarations preceding that node are visible.
+        scope = self
+        while scope is not None:
+            decl = scope.lookup_local(name, before)
+            if decl is not None:
+                return decl
+            scope = scope.parent
+        return None
+
+class IntervalIndex(object):
+    # Node extents of one file sorted by (start, -end). Extents are nested;
+    # one that crosses its enclosing extent is cut to it. The file is split
+    # into segments, each owned by the innermost extent covering it, so a
+    # point query is a single bisection.
+    def __init__(self, nodes):
+        entries = sorted((x.start_offset, -x.end_offset, x.node_id) for x in nodes)
+        self.starts = array.array("l", (x[0] for x in entries))
+        self.ends = array.array("l")
+        self.node_ids = array.array("l", (x[2] for x in entries))
+        # Position of the enclosing extent, or -1.
+        self.enclosing = array.array("l")
+        self.boundaries = array.array("l")
+        self.owners = array.array("l")
+        stack = []
+        for index, (start, end, node_id) in enumerate(entries):
+            end = -end
+            while stack and self.ends[stack[-1]] <= start:
+                self._pop(stack)
+            if stack:
+                end = min(end, self.ends[stack[-1]])
+            self.ends.append(end)
+            self.enclosing.append(stack[-1] if stack else -1)
+            if start < end:
+                self._add_boundary(start, index)
+                stack.append(index)
+        while stack:
+            self._pop(stack)
+
+    def _pop(self, stack):
+        end = self.ends[stack.pop()]
+        self._add_boundary(end, stack[-1] if stack else -1)
+
+    def _add_boundary(self, offset, owner):
+        if self.boundaries and self.boundaries[-1] == offset:
+            self.owners[-1] = owner
+            if len(self.owners) > 1 and self.owners[-2] == owner:
+                self.boundaries.pop()
+                self.owners.pop()
+        elif not self.owners or self.owners[-1] != owner:
+            self.boundaries.append(offset)
+            self.owners.append(owner)
+
+    def position_at(self, offset):
+        index = bisect.bisect_right(self.boundaries, offset) - 1
+        return self.owners[index] if index >= 0 else -1
+
+    def node_id_at(self, offset):
+        position = self.position_at(offset)
+        return self.node_ids[position] if position >= 0 else -1
+
+    def overlapping(self, start, end):
+        # Node ids of the extents meeting [start, end), outermost first: the
+        # extents enclosing start, then those beginning inside the range.
+        enclosing = []
+        position = self.position_at(start)
+        while position >= 0:
+            if self.starts[position] < start:
+                enclosing.append(self.node_ids[position])
+            position = self.enclosing[position]
+        first = bisect.bisect_left(self.starts, start)
+        last = bisect.bisect_left(self.starts, end, first)
+        enclosing.reverse()
+        enclosing.extend(self.node_ids[first:last])
+        return enclosing
+
 class TranslationUnitNode(Node):
     def __init__(self, cursor):
+        self.nodes = []
+        self.node_cursors = []
+        self.kind_postings = {}
+        self.type_postings = {}
+        self.file_names = []
+        self.file_ids = {}
+        self.file_ids_by_handle = {}
+        self.decoded_locations = {}
+        self.line_starts = {}
+        self.types = []
+        self.type_ids = {}
+        self.type_ids_by_name = {}
+        self.canonical_type_names = {}
+        self.decls = {}
+        self.decls_by_location = {}
+        self.decls_by_usr = {}
+        self.pending_decl_refs = []
+        self.translation_unit = cursor.translation_unit
+        self.main_file_id = None
+        self.token_table = None
+        self.token_owners = None
+        self.cursor_node_ids = {}
+        self.tag_decl_keys = set()
+        self.constant_values = {}
+        self.scopes = None
+        self.record_fields = None
+        self.interval_indexes = {}
+        self.subtree_sizes = None
+        self.depths = None
+        self.postorder = None
+        self.function_ids = None
+        self.cursor_cache = CursorCache(self.translation_unit)
+        self.cursor_cache.register("token_spellings", self._get_token_spellings)
         super(TranslationUnitNode, self).__init__(cursor, self)
-        self.var_decl_info = {}
+        self.main_file_id = self.get_file_id(clang.cindex.File.from_name(self.translation_unit, self.translation_unit.spelling))
 
-        self.global_var_defs = tuple(VarDeclNode(x, self) for x in cursor.get_children() if x.kind.name == "VAR_DECL" and x.storage_class.name in {"NONE", "STATIC"})
+        type_decl_kind_ids = {CursorKind.TYPEDEF_DECL.value, CursorKind.STRUCT_DECL.value, CursorKind.UNION_DECL.value, CursorKind.ENUM_DECL.value}
+        global_storage_class_ids = {StorageClass.NONE.value, StorageClass.STATIC.value}
+        top_level = self.cursor_cache.children(cursor)
+        self.type_decls = tuple(Node.create_node(x, self) for x in top_level if x._kind_id in type_decl_kind_ids and self.claim_tag_decl(x))
+        self.global_var_defs = tuple(Node.create_node(x, self) for x in top_level if x._kind_id == CursorKind.VAR_DECL.value and x.storage_class.value in global_storage_class_ids)
         for var in self.global_var_defs:
             var.set_global(True)
-        self.function_decls = tuple(FunctionDeclNode(x, self) for x in cursor.get_children() if x.kind.name == "FUNCTION_DECL")
+        self.function_decls = tuple(Node.create_node(x, self) for x in top_level if x._kind_id == CursorKind.FUNCTION_DECL.value)
         self.function_defs = tuple(x for x in self.function_decls if x.body is not None)
+        self.resolve_decl_refs()
 
         # TODO
         # support other nodes.
@@ -349,28 +793,412 @@ class TranslationUnitNode(Node):
     def __repr__(self):
         return "%s" % (type(self).__name__, )
 
-    def add_var_decl_info(self, offset, var_decl):
-        self.var_decl_info[offset] = var_decl
-
-    def find_var_decl(self, offset):
-        return self.var_decl_info.get(offset, None)
+    def get_file_id(self, file):
+        name = file.name if file else None
+        file_id = self.file_ids.get(name)
+        if file_id is None:
+            file_id = len(self.file_names)
+            self.file_ids[name] = file_id
+            self.file_names.append(name)
+        return file_id
+
+    def decode_location(self, location):
+        # Locations are decoded once, by their raw encoding, and file names
+        # once per file handle.
+        decoded = self.decoded_locations.get(location.int_data)
+        if decoded is None:
+            handle, offset = location.get_file_offset()
+            file_id = self.file_ids_by_handle.get(handle)
+            if file_id is None:
+                file_id = self.file_ids_by_handle[handle] = self.get_file_id(location.file)
+            decoded = self.decoded_locations[location.int_data] = (file_id, offset)
+        return decoded
+
+    def decode_extent(self, extent):
+        # (file id, start offset), (file id, end offset) without creating
+        # the locations of a range decoded before.
+        start = self.decoded_locations.get(extent.begin_int_data)
+        if start is None:
+            start = self.decode_location(extent.start)
+        end = self.decoded_locations.get(extent.end_int_data)
+        if end is None:
+            end = self.decode_location(extent.end)
+        return start, end
+
+    def get_type_id(self, var_type):
+        # Types are identified by their libclang QualType, so most lookups
+        # need no foreign call. Types spelled alike share one VarType.
+        key = (var_type._kind_id, var_type.data[0], var_type.data[1])
+        type_id = self.type_ids.get(key)
+        if type_id is None:
+            canonical = var_type.get_canonical()
+            canonical_key = (canonical._kind_id, canonical.data[0], canonical.data[1])
+            canonical_type_name = self.canonical_type_names.get(canonical_key)
+            if canonical_type_name is None:
+                canonical_type_name = self.canonical_type_names[canonical_key] = canonical.spelling
+            name = (var_type.spelling, canonical_type_name)
+            type_id = self.type_ids_by_name.get(name)
+            if type_id is None:
+                type_id = self.type_ids_by_name[name] = len(self.types)
+                size = var_type.get_size()
+                align = var_type.get_align()
+                self.types.append(VarType(name[0], name[1], size if size >= 0 else None, align if align >= 0 else None))
+            self.type_ids[key] = type_id
+        return type_id
+
+    def get_line_starts(self, file_id):
+        line_starts = self.line_starts.get(file_id)
+        if line_starts is None:
+            line_starts = self.line_starts[file_id] = array.array("l", [0])
+            contents = self.get_file_contents(file_id)
+            if contents:
+                index = contents.find(b"\n")
+                while index >= 0:
+                    line_starts.append(index + 1)
+                    index = contents.find(b"\n", index + 1)
+        return line_starts
+
+    def get_file_contents(self, file_id):
+        name = self.file_names[file_id]
+        if name is None:
+            return None
+        contents = self.translation_unit.get_file_contents(clang.cindex.File.from_name(self.translation_unit, name))
+        if contents is None:
+            try:
+                with open(name, "rb") as f:
+                    contents = f.read()
+            except IOError:
+                return None
+        return contents
+
+    def get_line_column(self, file_id, offset):
+        # 1-based line and byte column, as SourceLocation reports them.
+        line_starts = self.get_line_starts(file_id)
+        line = bisect.bisect_right(line_starts, offset)
+        return line, offset - line_starts[line - 1] + 1
+
+    def add_node(self, node, cursor):
+        node_id = len(self.nodes)
+        self.nodes.append(node)
+        self.node_cursors.append(cursor)
+        self.cursor_node_ids[node_key(cursor)] = node_id
+        postings = self.kind_postings.get(node.kind_id)
+        if postings is None:
+            postings = self.kind_postings[node.kind_id] = array.array("l")
+        postings.append(node_id)
+        postings = self.type_postings.get(type(node))
+        if postings is None:
+            postings = self.type_postings[type(node)] = array.array("l")
+        postings.append(node_id)
+        return node_id
+
+    def add_cursor(self, cursor, node):
+        self.cursor_node_ids[node_key(cursor)] = node.node_id
+
+    def nodes_of_kind(self, kind):
+        nodes = self.nodes
+        if not isinstance(kind, int):
+            kind = getattr(CursorKind, kind).value if isinstance(kind, str) else kind.value
+        return (nodes[x] for x in self.kind_postings.get(kind, ()))
+
+    def nodes_of_type(self, node_type):
+        postings = [v for k, v in self.type_postings.items() if issubclass(k, node_type)]
+        if len(postings) == 1:
+            node_ids = postings[0]
+        else:
+            node_ids = heapq.merge(*postings)
+        nodes = self.nodes
+        return (nodes[x] for x in node_ids)
+
+    def claim_tag_decl(self, cursor):
+        # libclang lists a struct, union or enum defined in a declaration
+        # under its scope and again under each declarator, e.g. the
+        # TYPEDEF_DECL of "typedef struct tag { ... } T;". It is wrapped
+        # only where it appears first, which is its scope.
+        if cursor._kind_id not in _tag_decl_kind_ids:
+            return True
+        key = cursor_key(cursor)
+        if key in self.tag_decl_keys:
+            return False
+        self.tag_decl_keys.add(key)
+        return True
+
+    def add_decl(self, decl):
+        # Redeclarations of one entity share a single referrer array.
+        self.decls[decl.decl_key] = decl
+        self.decls_by_location.setdefault((decl.file_id, decl.offset), decl)
+        if decl.usr:
+            redecls = self.decls_by_usr.setdefault(decl.usr, [])
+            if redecls:
+                decl.referrer_ids = redecls[0].referrer_ids
+            redecls.append(decl)
+
+    def find_decl(self, file_id, offset):
+        # Declarations from one macro expansion share a location; the
+        # first one is returned.
+        return self.decls_by_location.get((file_id, offset), None)
+
+    def find_decls_by_usr(self, usr):
+        return tuple(self.decls_by_usr.get(usr, ()))
+
+    def get_token_table(self):
+        # Tokens of the main file are read once and shared by every node.
+        if self.token_table is None:
+            self.token_table = self.translation_unit.tokenize_arrays(self.translation_unit.cursor.extent)
+        return self.token_table
+
+    def get_token_owners(self):
+        # Node id owning each token of the token table, or -1.
+        if self.token_owners is None:
+            table, cursors = self.translation_unit.annotate_tokens(self.translation_unit.cursor.extent)
+            if self.token_table is None:
+                self.token_table = table
+            cursor_node_ids = self.cursor_node_ids
+            self.token_owners = array.array("l", (cursor_node_ids.get(node_key(x), -1) for x in cursors))
+        return self.token_owners
+
+    def find_token_owner(self, offset):
+        table = self.get_token_table()
+        index = bisect.bisect_right(table.starts, offset) - 1
+        if index < 0 or offset >= table.ends[index]:
+            return None
+        node_id = self.get_token_owners()[index]
+        if node_id < 0:
+            return None
+        return self.nodes[node_id]
+
+    def find_token_before(self, file_id, offset, extent):
+        # Spelling of the last token before offset. Tokens outside the main
+        # file are read from extent.
+        if file_id == self.main_file_id:
+            table = self.get_token_table()
+        else:
+            table = self.translation_unit.tokenize_arrays(extent)
+        index = bisect.bisect_left(table.starts, offset) - 1
+        return table.spellings[index] if index >= 0 else None
+
+    def find_token(self, file_id, offset):
+        if file_id != self.main_file_id:
+            return None
+        table = self.get_token_table()
+        index = bisect.bisect_left(table.starts, offset)
+        if index < len(table.starts) and table.starts[index] == offset:
+            return table.spellings[index]
+        return None
+
+    def get_token_spellings(self, cursor):
+        return self.cursor_cache.lookup("token_spellings", cursor)
+
+    def _get_token_spellings(self, cursor):
+        # Same tokens as cursor.get_tokens() for plain source. Extents spelled
+        # elsewhere, such as macro arguments, are tokenized by libclang. Other
+        # macro expansions give the tokens at the expansion site, where
+        # cursor.get_tokens() would run on into the macro definition.
+        extent = self.cursor_cache.extent(cursor)
+        (start_file_id, start_offset), (end_file_id, end_offset) = self.decode_extent(extent)
+        if start_file_id == self.main_file_id and end_file_id == start_file_id and start_offset <= end_offset:
+            # Only a range touching a macro expansion can be spelled elsewhere.
+            if not (extent.begin_int_data | extent.end_int_data) & _MACRO_LOCATION_BIT or (
+                    extent.start.get_spelling_location()[3] == start_offset and extent.end.get_spelling_location()[3] == end_offset):
+                table = self.get_token_table()
+                first = bisect.bisect_left(table.starts, start_offset)
+                last = bisect.bisect_left(table.starts, end_offset, first)
+                return table.spellings[first:last]
+        return self.translation_unit.tokenize_arrays(extent).spellings
+
+    def number_nodes(self):
+        # Node ids are a preorder, so a subtree is a slice of self.nodes.
+        # Top-level nodes have no parent but are numbered as children of
+        # the translation unit.
+        count = len(self.nodes)
+        parent_ids = array.array("l", [-1]) * count
+        depths = array.array("l", [0]) * count
+        function_ids = array.array("l", [-1]) * count
+        for node in self.nodes:
+            if node is self:
+                continue
+            parent_id = node.parent.node_id if node.parent is not None else self.node_id
+            parent_ids[node.node_id] = parent_id
+            depths[node.node_id] = depths[parent_id] + 1
+            function_ids[node.node_id] = node.node_id if isinstance(node, FunctionDeclNode) else function_ids[parent_id]
+        subtree_sizes = array.array("l", [1]) * count
+        for node_id in range(count - 1, 0, -1):
+            subtree_sizes[parent_ids[node_id]] += subtree_sizes[node_id]
+        self.subtree_sizes = subtree_sizes
+        self.depths = depths
+        self.postorder = array.array("l", (x + subtree_sizes[x] - 1 - depths[x] for x in range(count)))
+        self.function_ids = function_ids
+
+    def get_subtree_sizes(self):
+        if self.subtree_sizes is None:
+            self.number_nodes()
+        return self.subtree_sizes
+
+    def get_depths(self):
+        if self.depths is None:
+            self.number_nodes()
+        return self.depths
+
+    def get_postorder(self):
+        if self.postorder is None:
+            self.number_nodes()
+        return self.postorder
+
+    def is_ancestor(self, ancestor, node):
+        # True also when node is ancestor.
+        return 0 <= node.node_id - ancestor.node_id < self.get_subtree_sizes()[ancestor.node_id]
+
+    def subtree(self, node):
+        # node and its descendants in preorder.
+        return self.nodes[node.node_id:node.node_id + self.get_subtree_sizes()[node.node_id]]
+
+    def enclosing_function(self, node):
+        # node itself if it is a function.
+        if self.function_ids is None:
+            self.number_nodes()
+        function_id = self.function_ids[node.node_id]
+        return self.nodes[function_id] if function_id >= 0 else None
+
+    def get_interval_index(self, file_id=None):
+        if file_id is None:
+            file_id = self.main_file_id
+        index = self.interval_indexes.get(file_id)
+        if index is None:
+            index = self.interval_indexes[file_id] = IntervalIndex(x for x in self.nodes if x.file_id == file_id and x is not self)
+        return index
+
+    def node_at(self, offset, file_id=None):
+        # Innermost node whose extent contains offset.
+        node_id = self.get_interval_index(file_id).node_id_at(offset)
+        return self.nodes[node_id] if node_id >= 0 else None
+
+    def nodes_overlapping(self, start, end, file_id=None):
+        return [self.nodes[x] for x in self.get_interval_index(file_id).overlapping(start, end)]
+
+    def get_record_fields(self, record_name):
+        # Field names of a struct or union in declaration order, by
+        # canonical type name.
+        if self.record_fields is None:
+            record_fields = {}
+            for field in self.nodes_of_type(FieldDeclNode):
+                fields = record_fields.setdefault(field.record_type.canonical_type_name, [])
+                if field.name not in fields:
+                    fields.append(field.name)
+            self.record_fields = record_fields
+        return self.record_fields.get(record_name, ())
+
+    def get_scopes(self):
+        if self.scopes is None:
+            file_scope = Scope(None, self, ordered=False)
+            scopes = {self.node_id: file_scope}
+            stack = [(x, file_scope) for x in reversed(self.type_decls + self.global_var_defs)]
+            for function in self.function_decls:
+                file_scope.add(function)
+                if function.body is not None:
+                    scope = scopes[function.node_id] = Scope(file_scope, function)
+                    for parameter in function.parameters:
+                        scope.add(parameter)
+                    stack.append((function.body, scope))
+            while stack:
+                node, scope = stack.pop()
+                if isinstance(node, (CompoundStmtNode, ForStmtNode)):
+                    scope = scopes[node.node_id] = Scope(scope, node)
+                elif isinstance(node, (VarDeclNode, TypedefDeclNode, EnumConstantDeclNode)):
+                    scope.add(node)
+                stack.extend((x, scope) for x in reversed(node.children))
+            self.scopes = scopes
+        return self.scopes
+
+    def scope_at(self, node):
+        scopes = self.get_scopes()
+        while node is not None:
+            scope = scopes.get(node.node_id)
+            if scope is not None:
+                return scope
+            node = node.parent
+        return scopes[self.node_id]
+
+    def lookup(self, node, name):
+        return self.scope_at(node).lookup(name, node)
+
+    def evaluate_constant(self, node):
+        value = self.constant_values.get(node.node_id, self.constant_values)
+        if value is self.constant_values:
+            evaluator = _constant_evaluators.get(type(node))
+            if evaluator is None:
+                value = self.constant_values[node.node_id] = None
+            else:
+                # Stored first so that "const int x = x;" ends.
+                self.constant_values[node.node_id] = None
+                value = self.constant_values[node.node_id] = evaluator(node)
+        return value
+
+    def add_decl_ref(self, referrer, key, usr):
+        self.pending_decl_refs.append((referrer, key, usr))
+
+    def resolve_decl_refs(self):
+        for referrer, key, usr in self.pending_decl_refs:
+            decl = self.decls.get(key) if key else None
+            if decl is None and usr in self.decls_by_usr:
+                decl = self.decls_by_usr[usr][0]
+            if decl is None:
+                continue
+            referrer.set_decl(decl)
+            decl.add_referrer(referrer)
+        self.pending_decl_refs = []
+
+class ParmDeclNode(DeclNode):
+    type = type_property("type_id")
 
-class ParmDeclNode(Node):
     def __init__(self, cursor, tu):
         super(ParmDeclNode, self).__init__(cursor, tu)
         self.create_children_nodes(cursor)
-        self.name = cursor.spelling
-        self.type = VarType(cursor.type)
+        self.type_id = tu.get_type_id(cursor.type)
+
+    def __repr__(self):
+        return "%s: %s::%s" % (type(self).__name__, self.name, self.type.type_name)
+
+class EnumConstantDeclNode(DeclNode):
+    def __init__(self, cursor, tu):
+        super(EnumConstantDeclNode, self).__init__(cursor, tu)
+        children = self.create_children_nodes(cursor)
+        self.value = cursor.enum_value
+        self.initial_value = children[0] if children else None
+
+    def __repr__(self):
+        return "%s: %s = %d" % (type(self).__name__, self.name, self.value)
+
+class FieldDeclNode(DeclNode):
+    type = type_property("type_id")
+    record_type = type_property("record_type_id")
+
+    def __init__(self, cursor, tu):
+        super(FieldDeclNode, self).__init__(cursor, tu)
+        self.create_children_nodes(cursor)
+        self.type_id = tu.get_type_id(cursor.type)
+        self.record_type_id = tu.get_type_id(cursor.semantic_parent.type)
 
     def __repr__(self):
         return "%s: %s::%s" % (type(self).__name__, self.name, self.type.type_name)
 
-class FunctionDeclNode(Node):
+class TypedefDeclNode(DeclNode):
+    underlying_type = type_property("underlying_type_id")
+
+    def __init__(self, cursor, tu):
+        super(TypedefDeclNode, self).__init__(cursor, tu)
+        self.create_children_nodes(cursor)
+        self.underlying_type_id = tu.get_type_id(cursor.underlying_typedef_type)
+
+    def __repr__(self):
+        return "%s: %s::%s" % (type(self).__name__, self.name, self.underlying_type.type_name)
+
+class FunctionDeclNode(DeclNode):
+    result_type = type_property("result_type_id")
+
     def __init__(self, cursor, tu):
         super(FunctionDeclNode, self).__init__(cursor, tu)
         children = self.create_children_nodes(cursor)
-        self.name = cursor.spelling
-        self.result_type = VarType(cursor.result_type)
+        self.result_type_id = tu.get_type_id(cursor.result_type)
         self.parameters = tuple(x for x in children if isinstance(x, ParmDeclNode))
 
         for child in children:
@@ -383,6 +1211,12 @@ class FunctionDeclNode(Node):
     def __repr__(self):
         return "%s: %s::%s" % (type(self).__name__, self.name, self.result_type.type_name)
 
+    def iter_call_sites(self):
+        for referrer in self.iter_referrers():
+            parent = referrer.parent
+            if isinstance(parent, CallExprNode) and parent.function is referrer:
+                yield parent
+
 hoge = None
 class CompoundStmtNode(Node):
     def __init__(self, cursor, tu):
@@ -402,6 +1236,185 @@ class CallExprNode(Node):
     def __repr__(self):
         return "%s" % (type(self).__name__, )
 
+_node_classes = dict((kind.value, node_class) for kind, node_class in (
+    (CursorKind.UNARY_OPERATOR, UnaryOperatorNode),
+    (CursorKind.BINARY_OPERATOR, BinaryOperatorNode),
+    (CursorKind.COMPOUND_ASSIGNMENT_OPERATOR, CompoundAssignmentOperatorNode),
+    (CursorKind.VAR_DECL, VarDeclNode),
+    (CursorKind.CSTYLE_CAST_EXPR, CStyleCastExprNode),
+    (CursorKind.CALL_EXPR, CallExprNode),
+    (CursorKind.DECL_STMT, DeclStmtNode),
+    (CursorKind.FUNCTION_DECL, FunctionDeclNode),
+    (CursorKind.FOR_STMT, ForStmtNode),
+    (CursorKind.IF_STMT, IfStmtNode),
+    (CursorKind.WHILE_STMT, WhileStmtNode),
+    (CursorKind.DO_STMT, DoStmtNode),
+    (CursorKind.SWITCH_STMT, SwitchStmtNode),
+    (CursorKind.CASE_STMT, CaseStmtNode),
+    (CursorKind.DEFAULT_STMT, DefaultStmtNode),
+    (CursorKind.BREAK_STMT, BreakStmtNode),
+    (CursorKind.CONTINUE_STMT, ContinueStmtNode),
+    (CursorKind.GOTO_STMT, GotoStmtNode),
+    (CursorKind.LABEL_STMT, LabelStmtNode),
+    (CursorKind.CONDITIONAL_OPERATOR, ConditionalOperatorNode),
+    (CursorKind.DECL_REF_EXPR, DeclRefExprNode),
+    (CursorKind.STRING_LITERAL, StringLiteralNode),
+    (CursorKind.INTEGER_LITERAL, IntegerLiteralNode),
+    (CursorKind.RETURN_STMT, ReturnStmtNode),
+    (CursorKind.PARM_DECL, ParmDeclNode),
+    (CursorKind.MEMBER_REF_EXPR, MemberRefExprNode),
+    (CursorKind.FIELD_DECL, FieldDeclNode),
+    (CursorKind.ENUM_CONSTANT_DECL, EnumConstantDeclNode),
+    (CursorKind.CXX_UNARY_EXPR, UnaryExprNode),
+    (CursorKind.INIT_LIST_EXPR, InitListExprNode),
+    (CursorKind.TYPEDEF_DECL, TypedefDeclNode),
+    (CursorKind.COMPOUND_STMT, CompoundStmtNode),
+))
+
+# Set in the raw encoding of a location inside a macro expansion.
+_MACRO_LOCATION_BIT = 1 << 31
+
+_tag_decl_kind_ids = {CursorKind.STRUCT_DECL.value, CursorKind.UNION_DECL.value, CursorKind.ENUM_DECL.value}
+
+_transparent_kind_ids = {CursorKind.PAREN_EXPR.value, CursorKind.UNEXPOSED_EXPR.value}
+
+_TYPE_QUALIFIER_WORDS = {"const", "volatile"}
+_TAG_WORDS = {"struct", "union", "enum"}
+_BUILTIN_TYPE_WORDS = {"char", "short", "int", "long", "signed", "unsigned", "float", "double", "_Bool"}
+
+def _builtin_type_name(words):
+    # Canonical spelling of a builtin type such as "long int", or None.
+    words = [x for x in words if x not in _TYPE_QUALIFIER_WORDS]
+    if not words or any(x not in _BUILTIN_TYPE_WORDS for x in words):
+        return None
+    sign = "unsigned " if "unsigned" in words else ""
+    longs = words.count("long")
+    if "char" in words:
+        return ("signed " if "signed" in words else sign) + "char"
+    elif "short" in words:
+        return sign + "short"
+    elif "double" in words:
+        return "long double" if longs else "double"
+    elif "float" in words or "_Bool" in words:
+        return words[0]
+    elif longs:
+        return sign + " ".join(["long"] * longs)
+    return sign + "int"
+
+_INTEGER_TYPE_NAMES = {
+    "_Bool", "char", "signed char", "unsigned char", "short", "unsigned short", "int", "unsigned int",
+    "long", "unsigned long", "long long", "unsigned long long", "__int128", "unsigned __int128",
+}
+
+def _wrap_integer(value, var_type):
+    # Converts value to var_type as C does; None if it is not an integer type.
+    if value is None or var_type.size is None:
+        return None
+    name = var_type.canonical_type_name
+    while name.startswith(("const ", "volatile ")):
+        name = name.split(" ", 1)[1]
+    if name == "_Bool":
+        return int(bool(value))
+    if name not in _INTEGER_TYPE_NAMES and not name.startswith("enum "):
+        return None
+    bits = var_type.size * 8
+    value &= (1 << bits) - 1
+    if not name.startswith("unsigned") and value >> (bits - 1):
+        value -= 1 << bits
+    return value
+
+def _divide(a, b):
+    if b == 0:
+        return None
+    quotient = abs(a) // abs(b)
+    return quotient if (a < 0) == (b < 0) else -quotient
+
+def _remainder(a, b):
+    quotient = _divide(a, b)
+    return None if quotient is None else a - b * quotient
+
+_BINARY_OPERATIONS = {
+    "+": lambda a, b: a + b,
+    "-": lambda a, b: a - b,
+    "*": lambda a, b: a * b,
+    "/": _divide,
+    "%": _remainder,
+    "<<": lambda a, b: a << b if b >= 0 else None,
+    ">>": lambda a, b: a >> b if b >= 0 else None,
+    "&": lambda a, b: a & b,
+    "|": lambda a, b: a | b,
+    "^": lambda a, b: a ^ b,
+    "==": lambda a, b: int(a == b),
+    "!=": lambda a, b: int(a != b),
+    "<": lambda a, b: int(a < b),
+    ">": lambda a, b: int(a > b),
+    "<=": lambda a, b: int(a <= b),
+    ">=": lambda a, b: int(a >= b),
+}
+
+_UNARY_OPERATIONS = {
+    "-": lambda a: -a,
+    "+": lambda a: a,
+    "~": lambda a: ~a,
+    "!": lambda a: int(not a),
+}
+
+def _evaluate_unary_operator(node):
+    operation = _UNARY_OPERATIONS.get(node.operator)
+    if operation is None or node.is_postfix:
+        return None
+    value = node.operand.constant_value()
+    if value is None:
+        return None
+    return _wrap_integer(operation(value), node.type)
+
+def _evaluate_binary_operator(node):
+    left, right = node.operands
+    if node.operator in ("&&", "||"):
+        value = left.constant_value()
+        if value is None:
+            return None
+        if bool(value) == (node.operator == "||"):
+            return int(bool(value))
+        value = right.constant_value()
+        return None if value is None else int(bool(value))
+    operation = _BINARY_OPERATIONS.get(node.operator)
+    if operation is None:
+        return None
+    left_type, right_type = node.operand_types
+    a = _wrap_integer(left.constant_value(), left_type)
+    b = _wrap_integer(right.constant_value(), right_type) if a is not None else None
+    if b is None:
+        return None
+    return _wrap_integer(operation(a, b), node.type)
+
+def _evaluate_conditional_operator(node):
+    condition, true_value, false_value = node.operands
+    value = condition.constant_value()
+    if value is None:
+        return None
+    return _wrap_integer((true_value if value else false_value).constant_value(), node.type)
+
+def _evaluate_decl_ref(node):
+    decl = node.decl
+    if isinstance(decl, EnumConstantDeclNode):
+        return decl.value
+    if isinstance(decl, VarDeclNode) and decl.initial_value is not None:
+        if decl.type.canonical_type_name.startswith("const "):
+            return _wrap_integer(decl.initial_value.constant_value(), decl.type)
+    return None
+
+_constant_evaluators = {
+    IntegerLiteralNode: lambda node: node.literal,
+    UnaryExprNode: lambda node: node.value,
+    UnaryOperatorNode: _evaluate_unary_operator,
+    BinaryOperatorNode: _evaluate_binary_operator,
+    ConditionalOperatorNode: _evaluate_conditional_operator,
+    CStyleCastExprNode: lambda node: _wrap_integer(node.child.constant_value(), node.cast_type),
+    DeclRefExprNode: _evaluate_decl_ref,
+}
+
+
 def print_node(node, level=0):
     print("  " * level + repr(node))
     for child in node.children:
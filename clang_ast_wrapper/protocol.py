@@ -0,0 +1,131 @@
+# coding: utf-8
+
+"""
+Index of struct members used as dispatch tables, such as UEFI protocols.
+
+For every (struct canonical name, member name) pair, ProtocolIndex keeps
+the calls made through the member and the places a value is stored into
+it. A store is one of:
+
+    p->Member = value;
+    TYPE table = { value1, value2 };       (by field position)
+    TYPE table = { .Member = value };
+
+Sites are recorded as plain tuples with the unit, node id and source
+position, so the wrapped trees need not stay alive. The merged index
+lists the sites of each member in (unit, node id) order. update() swaps
+the run of one unit in the entries of the members it touches, so a
+change costs that unit's sites, not a merge of every unit.
+"""
+
+import bisect
+import collections
+
+import clang_ast_wrapper.node as cn
+import clang_ast_wrapper.util as cu
+
+CallSite = collections.namedtuple("CallSite", ["unit", "node_id", "file_name", "line", "caller"])
+AssignmentSite = collections.namedtuple("AssignmentSite", ["unit", "node_id", "file_name", "line", "function_usr", "function_name"])
+
+def member_key(member_ref):
+    return (cu.record_type_name(member_ref.type), member_ref.name)
+
+def iter_member_calls(root):
+    for call in root.nodes_of_type(cn.CallExprNode):
+        if isinstance(call.function, cn.MemberRefExprNode):
+            yield member_key(call.function), call
+
+def iter_member_assignments(root):
+    # Yields (key, site node, stored value).
+    for node in root.nodes_of_type(cn.BinaryOperatorNode):
+        if node.operator == "=" and type(node) is cn.BinaryOperatorNode:
+            left, right = node.operands
+            if isinstance(left, cn.MemberRefExprNode):
+                yield member_key(left), node, right
+    for node in root.nodes_of_type(cn.InitListExprNode):
+        record_name = cu.record_type_name(node.type)
+        fields = root.get_record_fields(record_name)
+        if not fields:
+            continue
+        index = 0
+        for child in node.children:
+            if isinstance(child, cn.DesignatedInitExprNode):
+                if len(child.field_names) != 1 or child.indices or child.field_names[0] not in fields:
+                    index = len(fields)
+                    continue
+                index = fields.index(child.field_names[0])
+                value = child.value
+            else:
+                value = child
+            if index < len(fields):
+                yield (record_name, fields[index]), child, value
+            index += 1
+
+class ProtocolIndex(object):
+    def __init__(self):
+        # unit -> {key: ([CallSite], [AssignmentSite])}
+        self.units = {}
+        # key -> ([CallSite], [AssignmentSite]) of all units
+        self.index = {}
+
+    def __repr__(self):
+        return "%s: %d units" % (type(self).__name__, len(self.units))
+
+    def update(self, unit, root):
+        sites = {}
+        for key, call in iter_member_calls(root):
+            caller = root.enclosing_function(call)
+            site = CallSite(unit, call.node_id, call.file_name, call.line, caller.name if caller else None)
+            sites.setdefault(key, ([], []))[0].append(site)
+        for key, node, value in iter_member_assignments(root):
+            function = cu.referenced_function(value)
+            site = AssignmentSite(unit, node.node_id, node.file_name, node.line,
+                                  function.usr if function else None, function.name if function else None)
+            sites.setdefault(key, ([], []))[1].append(site)
+        for calls, assignments in sites.values():
+            assignments.sort(key=lambda x: x.node_id)
+        old_sites = self.units.get(unit, {})
+        self.units[unit] = sites
+        self.replace_sites(unit, old_sites, sites)
+
+    def remove(self, unit):
+        old_sites = self.units.pop(unit, None)
+        if old_sites is not None:
+            self.replace_sites(unit, old_sites, {})
+
+    def replace_sites(self, unit, old_sites, sites):
+        index = self.index
+        for key in set(old_sites) | set(sites):
+            entry = index.get(key)
+            if entry is None:
+                entry = index[key] = ([], [])
+            for items, new_items in zip(entry, sites.get(key, ((), ()))):
+                # The sites of one unit are a contiguous run.
+                start = bisect.bisect_left(items, (unit,))
+                end = start
+                while end < len(items) and items[end].unit == unit:
+                    end += 1
+                items[start:end] = new_items
+            if not entry[0] and not entry[1]:
+                del index[key]
+
+    def get_index(self):
+        return self.index
+
+    def call_sites(self, record_name, member_name):
+        return self.get_index().get((record_name, member_name), ((), ()))[0]
+
+    def assignment_sites(self, record_name, member_name):
+        return self.get_index().get((record_name, member_name), ((), ()))[1]
+
+    def targets(self, record_name, member_name):
+        # Functions stored into the member, as (usr, name) pairs.
+        result = []
+        for site in self.assignment_sites(record_name, member_name):
+            target = (site.function_usr, site.function_name)
+            if site.function_name is not None and target not in result:
+                result.append(target)
+        return result
+
+    def members(self):
+        return sorted(self.get_index())
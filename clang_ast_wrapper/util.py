@@ -1,3 +1,4 @@
+import clang_ast_wrapper.node as cn
 
 def is_function_call(node, name, class_name=None):
     if not node.kind == "CALL_EXPR":
@@ -14,3 +15,89 @@ def is_function_call(node, name, class_name=None):
             return True
         else:
             return False
+
+def _normalize_type_name(type_name):
+    return " ".join(type_name.split())
+
+def referenced_function(node):
+    # The function named by an expression such as f, &f or (TYPE)f.
+    while True:
+        if isinstance(node, cn.CStyleCastExprNode):
+            node = node.child
+        elif isinstance(node, cn.UnaryOperatorNode) and node.operator in ("&", "*"):
+            node = node.operand
+        else:
+            break
+    if isinstance(node, cn.DeclRefExprNode) and isinstance(node.decl, cn.FunctionDeclNode):
+        return node.decl
+    return None
+
+_TYPE_QUALIFIERS = {"*", "const", "volatile", "restrict"}
+_record_type_names = {}
+
+def record_type_name(var_type):
+    # Canonical name of the struct or union a member is accessed through:
+    # "const struct _S *const" -> "struct _S".
+    canonical_type_name = var_type.canonical_type_name
+    name = _record_type_names.get(canonical_type_name)
+    if name is None:
+        tokens = canonical_type_name.replace("*", " * ").split()
+        while tokens and tokens[-1] in _TYPE_QUALIFIERS:
+            tokens.pop()
+        while tokens and tokens[0] in _TYPE_QUALIFIERS:
+            tokens.pop(0)
+        name = _record_type_names[canonical_type_name] = " ".join(tokens)
+    return name
+
+class CallMatcher(object):
+    def __init__(self, targets=()):
+        # name -> (targets without class, {type name: targets})
+        self.targets = {}
+        self.type_name_cache = {}
+        for target in targets:
+            if isinstance(target, tuple):
+                self.add_target(*target)
+            else:
+                self.add_target(target)
+
+    def add_target(self, name, class_name=None):
+        target = (name, class_name)
+        free_targets, class_targets = self.targets.setdefault(name, ([], {}))
+        if class_name is None:
+            free_targets.append(target)
+        else:
+            class_name = _normalize_type_name(class_name)
+            class_targets.setdefault(class_name, []).append(target)
+            class_targets.setdefault(class_name + " *", []).append(target)
+
+    def normalize(self, type_name):
+        normalized = self.type_name_cache.get(type_name)
+        if normalized is None:
+            normalized = self.type_name_cache[type_name] = _normalize_type_name(type_name)
+        return normalized
+
+    def match(self, node):
+        if not isinstance(node, cn.CallExprNode):
+            return ()
+        function = node.function
+        entry = self.targets.get(getattr(function, "name", None))
+        if entry is None:
+            return ()
+        free_targets, class_targets = entry
+        if isinstance(function, cn.DeclRefExprNode):
+            return tuple(free_targets)
+        elif isinstance(function, cn.MemberRefExprNode) and class_targets:
+            type_names = {self.normalize(function.type.type_name), self.normalize(function.type.canonical_type_name)}
+            result = []
+            for type_name in type_names:
+                for target in class_targets.get(type_name, ()):
+                    if target not in result:
+                        result.append(target)
+            return tuple(result)
+        return ()
+
+    def find_calls(self, tu):
+        for node in tu.nodes_of_type(cn.CallExprNode):
+            targets = self.match(node)
+            if targets:
+                yield node, targets
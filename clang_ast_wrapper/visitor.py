@@ -0,0 +1,152 @@
+# coding: utf-8
+
+"""
+Visitors over the wrapper tree.
+
+A NodeVisitor subclass defines visit_<ClassName> handlers, called in
+preorder, and leave_<ClassName> handlers, called after the children. A
+handler for a base class (visit_DeclNode, visit_Node) is used for
+subclasses without their own. Returning SKIP from a visit_ handler skips
+the children and the leave_ handler of that node.
+
+    class CallCounter(NodeVisitor):
+        def __init__(self):
+            self.count = 0
+
+        def visit_CallExprNode(self, node):
+            self.count += 1
+
+    visit_all(root, [CallCounter(), OtherRule()])
+
+visit_all runs any number of visitors in one traversal. A visitor that
+skips a subtree is left out there while the others go on.
+
+A NodeTransformer uses the same handlers; leave_ handlers return the node
+that replaces the visited one, or None to remove it. Replaced children are
+also updated in the attributes of their parent (operands, body, ...).
+Nodes created by a transformer are not added to the indexes of
+TranslationUnitNode.
+"""
+
+from clang_ast_wrapper.node import Node
+
+class _Skip(object):
+    def __repr__(self):
+        return "SKIP"
+
+SKIP = _Skip()
+
+def _find_handler(visitor_class, node_class, prefix):
+    for cls in node_class.__mro__:
+        handler = getattr(visitor_class, prefix + cls.__name__, None)
+        if handler is not None:
+            return handler
+    return None
+
+class NodeVisitor(object):
+    @classmethod
+    def get_handlers(cls, node_class):
+        cache = cls.__dict__.get("_handler_cache")
+        if cache is None:
+            cache = {}
+            cls._handler_cache = cache
+        handlers = cache.get(node_class)
+        if handlers is None:
+            handlers = cache[node_class] = (_find_handler(cls, node_class, "visit_"), _find_handler(cls, node_class, "leave_"))
+        return handlers
+
+    def visit(self, node):
+        get_handlers = self.get_handlers
+        stack = [(node, False)]
+        while stack:
+            node, leaving = stack.pop()
+            visit, leave = get_handlers(type(node))
+            if leaving:
+                leave(self, node)
+                continue
+            if visit is not None and visit(self, node) is SKIP:
+                continue
+            if leave is not None:
+                stack.append((node, True))
+            stack.extend((x, False) for x in reversed(node.children))
+
+class MultiVisitor(object):
+    def __init__(self, visitors):
+        self.visitors = tuple(visitors)
+        self.handler_cache = {}
+
+    def get_handlers(self, node_class):
+        handlers = self.handler_cache.get(node_class)
+        if handlers is None:
+            visits = []
+            leaves = []
+            for index, visitor in enumerate(self.visitors):
+                visit, leave = type(visitor).get_handlers(node_class)
+                if visit is not None:
+                    visits.append((1 << index, visitor, visit))
+                if leave is not None:
+                    leaves.append((1 << index, visitor, leave))
+            handlers = self.handler_cache[node_class] = (tuple(visits), tuple(leaves))
+        return handlers
+
+    def visit(self, node):
+        get_handlers = self.get_handlers
+        stack = [(node, (1 << len(self.visitors)) - 1, False)]
+        while stack:
+            node, active, leaving = stack.pop()
+            visits, leaves = get_handlers(type(node))
+            if leaving:
+                for bit, visitor, leave in leaves:
+                    if active & bit:
+                        leave(visitor, node)
+                continue
+            for bit, visitor, visit in visits:
+                if active & bit and visit(visitor, node) is SKIP:
+                    active &= ~bit
+            if not active:
+                continue
+            if leaves:
+                stack.append((node, active, True))
+            stack.extend((x, active, False) for x in reversed(node.children))
+
+def visit_all(node, visitors):
+    MultiVisitor(visitors).visit(node)
+
+def _replace_children(node, children):
+    replaced = dict((id(old), new) for old, new in zip(node.children, children) if new is not old)
+    for name, value in list(vars(node).items()):
+        if name in ("children", "parent", "tu"):
+            continue
+        if isinstance(value, Node):
+            if id(value) in replaced:
+                setattr(node, name, replaced[id(value)])
+        elif isinstance(value, tuple) and any(id(x) in replaced for x in value if isinstance(x, Node)):
+            value = tuple(replaced.get(id(x), x) if isinstance(x, Node) else x for x in value)
+            setattr(node, name, tuple(x for x in value if x is not None))
+    node.set_children(tuple(x for x in children if x is not None))
+
+class NodeTransformer(NodeVisitor):
+    def visit(self, node):
+        get_handlers = self.get_handlers
+        # results holds the replacement of every finished node; the last
+        # len(node.children) entries belong to the node being left.
+        results = []
+        stack = [(node, False)]
+        while stack:
+            node, leaving = stack.pop()
+            visit, leave = get_handlers(type(node))
+            if not leaving:
+                if visit is not None and visit(self, node) is SKIP:
+                    results.append(node)
+                    continue
+                stack.append((node, True))
+                stack.extend((x, False) for x in reversed(node.children))
+                continue
+            count = len(node.children)
+            if count:
+                children = results[-count:]
+                del results[-count:]
+                if any(new is not old for new, old in zip(children, node.children)):
+                    _replace_children(node, children)
+            results.append(node if leave is None else leave(self, node))
+        return results[0]
@@ -0,0 +1,92 @@
+import unittest
+import clang
+import clang.cindex
+import clang_ast_wrapper.node as cn
+import clang_ast_wrapper.callgraph as cc
+
+HEADER = """
+typedef struct _PROTOCOL {
+    int (*Read)(struct _PROTOCOL *This, int Size);
+} PROTOCOL;
+int foo(int);
+void install(PROTOCOL *);
+"""
+
+class TestCallGraph(unittest.TestCase):
+    def parse(self, name, content):
+        index = clang.cindex.Index.create()
+        tu = index.parse(name, unsaved_files=((name, HEADER + content),))
+        root = cn.TranslationUnitNode(tu.cursor)
+        return root
+
+    def test_call_graph(self):
+        main_c = """
+        static int helper(void) { return 0; }
+        int main(void)
+        {
+            PROTOCOL protocol;
+            install(&protocol);
+            return foo(helper()) + protocol.Read(&protocol, 1);
+        }
+        """
+        lib_c = """
+        static int helper(void) { return 1; }
+        static int MyRead(PROTOCOL *This, int Size) { return helper(); }
+        int foo(int a) { return a; }
+        void install(PROTOCOL *p) { p->Read = MyRead; }
+        int unused(void) { return foo(1); }
+        """
+        graph = cc.CallGraph()
+        graph.update("main.c", self.parse("main.c", main_c))
+        graph.update("lib.c", self.parse("lib.c", lib_c))
+
+        main, = graph.find("main")
+        foo, = graph.find("foo")
+        read, = graph.find("struct _PROTOCOL::Read")
+        my_read, = graph.find("MyRead")
+        helpers = graph.find("helper")
+        self.assertEqual(len(helpers), 2)
+        self.assertTrue(graph.is_member[read])
+        self.assertEqual(sorted(graph.names[x] for x in graph.successors(main)),
+                         ["foo", "helper", "install", "struct _PROTOCOL::Read"])
+        self.assertEqual(list(graph.successors(read)), [my_read])
+        self.assertEqual(sorted(graph.names[x] for x in graph.predecessors(foo)), ["main", "unused"])
+        reachable = graph.reachable([main])
+        self.assertEqual(sorted(graph.names[x] for x in range(len(graph.keys)) if reachable[x]),
+                         ["MyRead", "foo", "helper", "helper", "install", "main", "struct _PROTOCOL::Read"])
+        self.assertTrue(graph.is_defined(my_read))
+
+        lib_c = lib_c.replace("p->Read = MyRead;", "")
+        graph.update("lib.c", self.parse("lib.c", lib_c))
+        self.assertEqual(list(graph.successors(read)), [])
+        self.assertFalse(graph.reachable([main])[my_read])
+        graph.remove("lib.c")
+        self.assertEqual(list(graph.predecessors(foo)), [main])
+        self.assertFalse(graph.is_defined(foo))
+
+    def test_shared_edges(self):
+        # common() is defined by both units, e.g. through a shared header.
+        a_c = """
+        int common(void) { return foo(1); }
+        int a(void) { return foo(2); }
+        """
+        graph = cc.CallGraph()
+        graph.update("a.c", self.parse("a.c", a_c))
+        graph.update("b.c", self.parse("b.c", a_c.replace("a(void)", "b(void)")))
+        foo, = graph.find("foo")
+        common, = graph.find("common")
+        self.assertEqual(sorted(graph.names[x] for x in graph.predecessors(foo)), ["a", "b", "common"])
+        self.assertEqual(list(graph.predecessors(foo)), sorted(graph.predecessors(foo)))
+        self.assertEqual(graph.edge_counts[(common, foo)], 2)
+
+        graph.update("a.c", self.parse("a.c", a_c))
+        self.assertEqual(graph.edge_counts[(common, foo)], 2)
+        graph.remove("b.c")
+        self.assertEqual(graph.edge_counts[(common, foo)], 1)
+        self.assertEqual(sorted(graph.names[x] for x in graph.predecessors(foo)), ["a", "common"])
+        graph.update("a.c", self.parse("a.c", "int common(void) { return 0; }"))
+        self.assertEqual(list(graph.predecessors(foo)), [])
+        self.assertEqual(graph.edge_counts, {})
+        self.assertTrue(graph.is_defined(common))
+        graph.remove("a.c")
+        self.assertFalse(graph.is_defined(common))
@@ -0,0 +1,90 @@
+import unittest
+import clang
+import clang.cindex
+import clang_ast_wrapper.node as cn
+import clang_ast_wrapper.cfg as cc
+
+class TestCfg(unittest.TestCase):
+    def parse(self, content):
+        index = clang.cindex.Index.create()
+        tu = index.parse("sample.c", unsaved_files=(("sample.c", content),))
+        root = cn.TranslationUnitNode(tu.cursor)
+        return root
+
+    def test_build_cfg(self):
+        sample = """
+        void f(int);
+        int func(int a)
+        {
+            int i = 0;
+            while (a > 0) {
+                if (a == 5)
+                    break;
+                f(1);
+                a--;
+            }
+            do {
+                f(2);
+                if (a)
+                    continue;
+                f(3);
+            } while (a--);
+            switch (a) {
+            case 0:
+                f(4);
+            case 1:
+                f(5);
+                break;
+            default:
+                goto out;
+            }
+            for (i = 0; i < a; i++) {
+                f(6);
+            }
+            return i;
+        out:
+            f(7);
+            return -1;
+        }
+        """
+        root = self.parse(sample)
+        self.assertEqual([x for x in root.nodes_of_type(cn.Node) if type(x) is cn.Node and x.kind.endswith("_STMT")], [])
+        cfg = cc.build_cfg(root.function_defs[0])
+        calls = dict((x.arguments[0].literal, cfg.block_of(x)) for x in root.nodes_of_type(cn.CallExprNode))
+        self.assertEqual(len(set(calls.values())), 7)
+        self.assertNotIn(None, calls.values())
+        self.assertEqual(list(cfg.predecessors(cc.ENTRY)), [])
+        self.assertEqual(list(cfg.successors(cc.EXIT)), [])
+
+        while_stmt = next(root.nodes_of_type(cn.WhileStmtNode))
+        while_condition = cfg.block_of(while_stmt.condition)
+        self.assertEqual(list(cfg.successors(cc.ENTRY)), [while_condition])
+        self.assertEqual(list(cfg.successors(calls[1])), [while_condition])
+
+        do_stmt = next(root.nodes_of_type(cn.DoStmtNode))
+        do_condition = cfg.block_of(do_stmt.condition)
+        self.assertIn(calls[2], cfg.successors(do_condition))
+        continue_block, join_block = cfg.successors(calls[2])
+        self.assertEqual(list(cfg.successors(continue_block)), [do_condition])
+        self.assertEqual(join_block, calls[3])
+        self.assertEqual(list(cfg.successors(calls[3])), [do_condition])
+
+        switch_stmt = next(root.nodes_of_type(cn.SwitchStmtNode))
+        switch_block = cfg.block_of(switch_stmt.condition)
+        self.assertEqual(len(cfg.successors(switch_block)), 3)
+        self.assertIn(calls[4], cfg.successors(switch_block))
+        self.assertIn(calls[5], cfg.successors(switch_block))
+        self.assertIn(calls[5], cfg.successors(calls[4]))
+
+        self.assertEqual(next(root.nodes_of_type(cn.GotoStmtNode)).label, "out")
+        self.assertEqual(next(root.nodes_of_type(cn.LabelStmtNode)).label, "out")
+        default_block = cfg.predecessors(calls[7])[0]
+        self.assertEqual(len(cfg.predecessors(calls[7])), 1)
+        self.assertIn(default_block, cfg.successors(switch_block))
+        self.assertEqual(list(cfg.successors(calls[7])), [cc.EXIT])
+
+        returns = [cfg.block_of(x) for x in root.nodes_of_type(cn.ReturnStmtNode)]
+        self.assertEqual(sorted(cfg.predecessors(cc.EXIT)), sorted(returns))
+        reachable = cfg.reachable()
+        self.assertTrue(all(reachable[x] for x in calls.values()))
+        self.assertTrue(reachable[cc.EXIT])
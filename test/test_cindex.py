@@ -0,0 +1,116 @@
+import os
+import types
+import unittest
+import clang
+import clang.cindex
+
+class TestCindex(unittest.TestCase):
+    def parse(self, content):
+        index = clang.cindex.Index.create()
+        return index.parse("sample.c", unsaved_files=(("sample.c", content),))
+
+    def test_walk(self):
+        sample = """
+        int func1(int a)
+        {
+            return a + 1;
+        }
+        int func2(int b)
+        {
+            if (b) {
+                return func1(b);
+            }
+            return 0;
+        }
+        """
+        tu = self.parse(sample)
+
+        def walk_preorder(cursor):
+            yield cursor
+            for child in cursor.get_children():
+                for descendant in walk_preorder(child):
+                    yield descendant
+
+        def walk_postorder(cursor):
+            for child in cursor.get_children():
+                for descendant in walk_postorder(child):
+                    yield descendant
+            yield cursor
+
+        expected = [(x.kind, x.location.offset) for x in walk_preorder(tu.cursor)]
+        self.assertEqual([(x.kind, x.location.offset) for x in tu.cursor.walk_preorder()], expected)
+        expected = [(x.kind, x.location.offset) for x in walk_postorder(tu.cursor)]
+        self.assertEqual([(x.kind, x.location.offset) for x in tu.cursor.walk_postorder()], expected)
+        walk = tu.cursor.walk_preorder()
+        self.assertIsInstance(walk, types.GeneratorType)
+        self.assertEqual(next(walk), tu.cursor)
+
+        kinds = [clang.cindex.CursorKind.RETURN_STMT, clang.cindex.CursorKind.CALL_EXPR]
+        found = list(tu.cursor.walk_filtered(kinds))
+        self.assertEqual([x.kind for x in found], [kinds[0], kinds[0], kinds[1], kinds[0]])
+        self.assertIs(found[0].translation_unit, tu)
+
+        prune = lambda x: x.kind == clang.cindex.CursorKind.IF_STMT
+        found = list(tu.cursor.walk_filtered(kinds, prune))
+        self.assertEqual([x.kind for x in found], [kinds[0], kinds[0]])
+
+        calls = []
+        def error(cursor):
+            calls.append(cursor)
+            if len(calls) > 1:
+                raise ValueError("prune")
+        self.assertRaises(ValueError, lambda: list(tu.cursor.walk_filtered(prune=error)))
+
+    def test_tokenize_arrays(self):
+        sample = "int a = 0x10; /* c */\nchar *s = \"str\";\n"
+        tu = self.parse(sample)
+        tokens = tu.tokenize_arrays(tu.cursor.extent)
+        expected = list(tu.get_tokens(extent=tu.cursor.extent))
+        self.assertEqual(tokens.spellings, [x.spelling for x in expected])
+        self.assertEqual(list(tokens.kinds), [x.kind.value for x in expected])
+        self.assertEqual(list(tokens.starts), [x.extent.start.offset for x in expected])
+        self.assertEqual(list(tokens.ends), [x.extent.end.offset for x in expected])
+        self.assertIs(tokens.spellings[0], tu.tokenize_arrays(tu.cursor.extent).spellings[0])
+
+        # Offsets within an included file.
+        include_dir = os.path.abspath("include")
+        index = clang.cindex.Index.create()
+        tu = index.parse("sample.c", args=["-I" + include_dir],
+                         unsaved_files=(("sample.c", '#include "sample.h"\nint b;\n'),
+                                        (os.path.join(include_dir, "sample.h"), "int a;\nint hfunc(int x) { return x; }\n")))
+        hfunc = [x for x in tu.cursor.get_children() if x.spelling == "hfunc"][0]
+        tokens = tu.tokenize_arrays(hfunc.extent)
+        expected = list(hfunc.get_tokens())
+        self.assertEqual(tokens.spellings, [x.spelling for x in expected])
+        self.assertEqual(list(tokens.starts), [x.extent.start.offset for x in expected])
+        self.assertEqual(tokens.starts[0], len("int a;\n"))
+
+    def test_annotate_tokens(self):
+        sample = "int a = 1;\nint func(void) { return a; }\n"
+        tu = self.parse(sample)
+        tokens, cursors = tu.annotate_tokens(tu.cursor.extent)
+        self.assertEqual(tokens, tu.tokenize_arrays(tu.cursor.extent))
+        expected = list(tu.get_tokens(extent=tu.cursor.extent))
+        self.assertEqual(len(cursors), len(expected))
+        for token, cursor in zip(expected, cursors):
+            self.assertEqual(cursor, token.cursor)
+        self.assertEqual(cursors[-3].kind, clang.cindex.CursorKind.DECL_REF_EXPR)
+
+    def test_lazy_library(self):
+        self.parse("int a;")
+        lib = clang.cindex.conf.lib
+        self.assertIsInstance(lib, clang.cindex.LazyLibrary)
+        self.assertIn("clang_parseTranslationUnit", vars(lib))
+        self.assertTrue(clang.cindex.conf.function_exists("clang_getFileTime"))
+        self.assertEqual(lib.clang_getFileTime.restype, clang.cindex.c_uint)
+        self.assertFalse(clang.cindex.conf.function_exists("clang_notExistingFunction"))
+
+    def test_enum_names(self):
+        CursorKind = clang.cindex.CursorKind
+        self.assertEqual(CursorKind.name_of(CursorKind.CALL_EXPR.value), "CALL_EXPR")
+        self.assertEqual(CursorKind.CALL_EXPR.name, "CALL_EXPR")
+        self.assertEqual(clang.cindex.TypeKind.INT.name, "INT")
+        self.assertEqual(clang.cindex.StorageClass.STATIC.name, "STATIC")
+        with self.assertRaises(ValueError) as context:
+            clang.cindex.StorageClass.name_of(1000)
+        self.assertEqual(str(context.exception), "Unknown StorageClass value 1000")
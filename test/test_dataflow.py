@@ -0,0 +1,118 @@
+import unittest
+import clang
+import clang.cindex
+import clang_ast_wrapper.node as cn
+import clang_ast_wrapper.cfg as cc
+import clang_ast_wrapper.dataflow as cd
+
+class TestDataflow(unittest.TestCase):
+    def parse(self, content):
+        index = clang.cindex.Index.create()
+        tu = index.parse("sample.c", unsaved_files=(("sample.c", content),))
+        root = cn.TranslationUnitNode(tu.cursor)
+        return root
+
+    def test_dataflow(self):
+        sample = """
+        void use(int);
+        void init(int *);
+        int func(int a)
+        {
+            int x;
+            int y;
+            int z;
+            int w = 0;
+            init(&z);
+            if (a) {
+                x = 1;
+            }
+            use(x);
+            use(z);
+            while (a--) {
+                y = a;
+                w += y;
+            }
+            use(y);
+            return w;
+        }
+        """
+        root = self.parse(sample)
+        function = root.function_defs[0]
+        cfg = cc.build_cfg(function)
+        accesses = cd.FunctionAccesses(cfg)
+        self.assertEqual([x.name for x in accesses.variables], ["a", "x", "y", "z", "w"])
+        address, postfix = root.nodes_of_type(cn.UnaryOperatorNode)
+        self.assertEqual((address.operator, address.is_postfix), ("&", False))
+        self.assertEqual((postfix.operator, postfix.is_postfix), ("--", True))
+
+        uninitialized = cd.uninitialized_uses(cfg, accesses)
+        self.assertEqual([(x.name, x.parent.function.name) for x in uninitialized], [("x", "use"), ("y", "use")])
+
+        reaching = cd.ReachingDefinitions(cfg, accesses)
+        calls = list(root.nodes_of_type(cn.CallExprNode))
+        use_x = calls[1]
+        self.assertEqual(use_x.arguments[0].name, "x")
+        definitions = reaching.reaching(use_x)
+        self.assertEqual(sorted(type(x).__name__ for x in definitions if x.name == "x"), ["DeclRefExprNode"])
+        self.assertEqual(sorted(x.name for x in definitions), ["a", "w", "x", "z"])
+        return_stmt = next(root.nodes_of_type(cn.ReturnStmtNode))
+        w_definitions = [x for x in reaching.reaching(return_stmt) if x.name == "w"]
+        self.assertEqual(len(w_definitions), 2)
+        a_definitions = [x for x in reaching.reaching(return_stmt) if x.name == "a"]
+        self.assertEqual(a_definitions, [postfix.operand])
+
+        liveness = cd.Liveness(cfg, accesses)
+        # init(&z) may leave z unchanged, so z is live before it.
+        self.assertEqual([x.name for x in liveness.live_variables(liveness.live_in[cc.ENTRY])], ["a", "x", "y", "z"])
+        self.assertEqual(liveness.live_in[cc.EXIT], 0)
+        loop = next(root.nodes_of_type(cn.WhileStmtNode))
+        condition = cfg.block_of(loop.condition)
+        self.assertEqual([x.name for x in liveness.live_variables(liveness.live_in[condition])], ["a", "y", "w"])
+
+    def test_address_taken(self):
+        sample = """
+        void use(int);
+        void func(void)
+        {
+            int x = 1;
+            int *p = &x;
+            use(x);
+            x = 2;
+            use(x);
+        }
+        """
+        root = self.parse(sample)
+        function = root.function_defs[0]
+        cfg = cc.build_cfg(function)
+        accesses = cd.FunctionAccesses(cfg)
+        reaching = cd.ReachingDefinitions(cfg, accesses)
+        x_decl = function.body.children[0].children[0]
+        address = next(root.nodes_of_type(cn.UnaryOperatorNode))
+        first_use, second_use = root.nodes_of_type(cn.CallExprNode)
+        self.assertEqual([x for x in reaching.reaching(first_use) if x.name == "x"], [x_decl, address.operand])
+        assignment = next(root.nodes_of_type(cn.BinaryOperatorNode))
+        self.assertEqual([x for x in reaching.reaching(second_use) if x.name == "x"], [assignment.operands[0]])
+        self.assertEqual(cd.uninitialized_uses(cfg, accesses), [])
+
+    def test_parenthesized_operands(self):
+        sample = """
+        void use(int);
+        void func(int *p)
+        {
+            int x = 0;
+            (x)++;
+            (*p)--;
+            ++(x);
+            -(x);
+            use(x);
+        }
+        """
+        root = self.parse(sample)
+        operators = list(root.nodes_of_type(cn.UnaryOperatorNode))
+        self.assertEqual([(x.operator, x.is_postfix) for x in operators],
+                         [("++", True), ("--", True), ("*", False), ("++", False), ("-", False)])
+        function = root.function_defs[0]
+        cfg = cc.build_cfg(function)
+        reaching = cd.ReachingDefinitions(cfg)
+        call = next(root.nodes_of_type(cn.CallExprNode))
+        self.assertEqual([x for x in reaching.reaching(call) if x.name == "x"], [operators[3].operand])
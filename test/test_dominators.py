@@ -0,0 +1,66 @@
+import unittest
+import clang
+import clang.cindex
+import clang_ast_wrapper.node as cn
+import clang_ast_wrapper.cfg as cc
+import clang_ast_wrapper.dominators as cd
+
+class TestDominators(unittest.TestCase):
+    def parse(self, content):
+        index = clang.cindex.Index.create()
+        tu = index.parse("sample.c", unsaved_files=(("sample.c", content),))
+        root = cn.TranslationUnitNode(tu.cursor)
+        return root
+
+    def test_dominator_tree(self):
+        sample = """
+        int AllocatePool(int, void **);
+        void Use(void *);
+        int func(int a)
+        {
+            void *p;
+            int status = AllocatePool(a, &p);
+            if (status) {
+                Use(0);
+                return status;
+            }
+            while (a > 0) {
+                Use(p);
+                a--;
+            }
+            for (;;) {
+            }
+        }
+        """
+        root = self.parse(sample)
+        cfg = cc.build_cfg(root.function_defs[0])
+        tree = cd.dominator_tree(cfg)
+        post_tree = cd.post_dominator_tree(cfg)
+
+        calls = list(root.nodes_of_type(cn.CallExprNode))
+        allocate, use_error, use_loop = calls
+        check = next(root.nodes_of_type(cn.IfStmtNode)).condition
+        error_block = cfg.block_of(use_error)
+        loop_block = cfg.block_of(use_loop)
+        self.assertEqual(cfg.block_of(allocate), cc.ENTRY)
+        for block in range(cfg.block_count):
+            if cfg.reachable()[block]:
+                self.assertTrue(tree.dominates(cc.ENTRY, block))
+        self.assertTrue(tree.strictly_dominates(cc.ENTRY, loop_block))
+        self.assertFalse(tree.dominates(error_block, loop_block))
+        self.assertFalse(tree.dominates(loop_block, error_block))
+        self.assertEqual(tree.immediate_dominator(error_block), cc.ENTRY)
+        self.assertIsNone(tree.immediate_dominator(cc.ENTRY))
+
+        self.assertTrue(tree.dominates_node(allocate, check))
+        self.assertTrue(tree.dominates_node(check, use_loop))
+        self.assertFalse(tree.dominates_node(check, allocate))
+        self.assertTrue(post_tree.dominates_node(check, allocate))
+        self.assertFalse(post_tree.dominates_node(allocate, check))
+        self.assertTrue(post_tree.dominates(cc.EXIT, error_block))
+
+        # The endless loop never reaches the exit, so every path from the
+        # check to the exit goes through the error branch.
+        self.assertTrue(post_tree.dominates_node(use_error, check))
+        self.assertFalse(post_tree.dominates(cc.EXIT, loop_block))
+        self.assertIsNone(post_tree.immediate_dominator(loop_block))
@@ -0,0 +1,43 @@
+import json
+import unittest
+import clang
+import clang.cindex
+import clang_ast_wrapper.node as cn
+import clang_ast_wrapper.instrument as ci
+
+class TestInstrument(unittest.TestCase):
+    def parse(self, content):
+        index = clang.cindex.Index.create()
+        tu = index.parse("sample.c", unsaved_files=(("sample.c", content),))
+        root = cn.TranslationUnitNode(tu.cursor)
+        return root
+
+    def test_profiler(self):
+        sample = """
+        int global1 = 1;
+        int func(int a)
+        {
+            return a + global1 * 2;
+        }
+        """
+        lib = clang.cindex.conf.lib
+        create_node = cn.Node.create_node
+        with ci.Profiler() as profiler:
+            root = self.parse(sample)
+        self.assertIs(clang.cindex.conf.lib, lib)
+        self.assertIs(cn.Node.create_node, create_node)
+
+        self.assertEqual(profiler.functions["clang_parseTranslationUnit"][0], 1)
+        self.assertGreater(profiler.functions["clang_visitChildren"][0], 0)
+        kinds = profiler.kinds
+        self.assertEqual(kinds["BINARY_OPERATOR"][0], 2)
+        self.assertEqual(kinds["FUNCTION_DECL"][0], 1)
+        self.assertEqual(kinds["VAR_DECL"][0], 1)
+        count, time, self_time = kinds["FUNCTION_DECL"]
+        self.assertLessEqual(self_time, time)
+
+        data = json.loads(profiler.to_json())
+        self.assertEqual(data["kinds"]["BINARY_OPERATOR"]["count"], 2)
+        table = profiler.format_table(limit=3)
+        self.assertIn("clang_parseTranslationUnit", profiler.format_table())
+        self.assertEqual(len(table.splitlines()), 1 + 3 + 1 + 1 + 3)
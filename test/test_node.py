@@ -1,4 +1,5 @@
 
+import os.path
 import unittest
 import clang
 import clang.cindex
@@ -42,8 +43,504 @@ class TestNode(unittest.TestCase):
         self.assertIs(a_decl1.referrers[0], a_referrer0)
         self.assertIs(a_referrer0.var_decl, a_decl1)
 
+    def test_scope(self):
+        sample = """
+        typedef int INT;
+        enum { LIMIT = 3 };
+        int a;
+        void func2(int);
+        void func(INT b)
+        {
+            func2(a);
+            int a;
+            {
+                int a;
+                func2(a + b);
+            }
+            for (int b = 0; b < LIMIT; b++) {
+                func2(a + b);
+            }
+        }
+        """
+        root = self.parse(sample)
+        function = root.function_defs[0]
+        global_a = root.global_var_defs[0]
+        parameter_b = function.parameters[0]
+        outer_a = function.body.children[1].children[0]
+        inner_a = function.body.children[2].children[0].children[0]
+        loop = function.body.children[3]
+        loop_b = loop.init.children[0]
+        calls = list(root.nodes_of_type(cn.CallExprNode))
+
+        file_scope = root.scope_at(root)
+        self.assertIs(file_scope.lookup("a"), global_a)
+        self.assertIs(file_scope.lookup("func2"), root.function_decls[0])
+        self.assertIsInstance(file_scope.lookup("LIMIT"), cn.EnumConstantDeclNode)
+        self.assertIsInstance(file_scope.lookup("INT"), cn.TypedefDeclNode)
+        self.assertIsNone(file_scope.lookup("b"))
+
+        self.assertIs(root.scope_at(calls[0]).node, function.body)
+        self.assertIs(root.scope_at(calls[0]).lookup("a"), outer_a)
+        self.assertIs(root.lookup(calls[0], "a"), global_a)
+        self.assertIs(root.lookup(calls[1], "a"), inner_a)
+        self.assertIs(root.lookup(calls[1], "b"), parameter_b)
+        self.assertIs(root.lookup(calls[2], "a"), outer_a)
+        self.assertIs(root.lookup(calls[2], "b"), loop_b)
+        self.assertIs(root.scope_at(loop_b).node, loop)
+        self.assertIs(root.lookup(loop.condition, "LIMIT"), file_scope.lookup("LIMIT"))
+        for call in calls:
+            for argument in call.arguments:
+                for ref in [argument] + list(argument.children):
+                    if isinstance(ref, cn.DeclRefExprNode):
+                        self.assertIs(root.lookup(ref, ref.name), ref.decl)
+
+    def test_decl_index(self):
+        header = """int h;
+        void func2(int);
+        """
+        sample = """int m;
+        #include "sample.h"
+        typedef struct { int x; } S;
+        void func(S *s)
+        {
+            func2(h + m + s->x);
+        }
+        void func2(int b)
+        {
+        }
+        """
+        include_dir = os.path.abspath("include")
+        index = clang.cindex.Index.create()
+        tu = index.parse("sample.c", args=["-I" + include_dir],
+                         unsaved_files=(("sample.c", sample), (os.path.join(include_dir, "sample.h"), header)))
+        root = cn.TranslationUnitNode(tu.cursor)
+        m_decl, h_decl = root.global_var_defs
+        self.assertEqual(m_decl.offset, h_decl.offset)
+        self.assertNotEqual(m_decl.file_id, h_decl.file_id)
+        self.assertIs(root.find_decl(m_decl.file_id, m_decl.offset), m_decl)
+        self.assertIs(root.find_decl(h_decl.file_id, h_decl.offset), h_decl)
+        self.assertEqual(root.find_decls_by_usr(h_decl.usr), (h_decl,))
+
+        typedef = root.type_decls[-1]
+        self.assertIsInstance(typedef, cn.TypedefDeclNode)
+        self.assertEqual(typedef.name, "S")
+        self.assertIs(root.find_decls_by_usr(typedef.usr)[0], typedef)
+
+        self.assertEqual([x.name for x in root.find_decls_by_usr(root.function_defs[1].usr)], ["func2", "func2"])
+        parm = root.function_defs[0].parameters[0]
+        self.assertIs(root.find_decl(parm.file_id, parm.offset), parm)
+
+        self.assertEqual(len(m_decl.referrers), 1)
+        self.assertEqual(len(h_decl.referrers), 1)
+        self.assertIs(h_decl.referrers[0].var_decl, h_decl)
+
+    def test_macro_decls(self):
+        sample = """
+        #define DECL2(a, b) int a; int b;
+        DECL2(m, n)
+        int func(void)
+        {
+            return n + n + m;
+        }
+        """
+        root = self.parse(sample)
+        m_decl, n_decl = root.global_var_defs
+        self.assertEqual((m_decl.file_id, m_decl.offset), (n_decl.file_id, n_decl.offset))
+        self.assertEqual([x.name for x in n_decl.referrers], ["n", "n"])
+        self.assertEqual([x.name for x in m_decl.referrers], ["m"])
+        self.assertEqual(root.find_decls_by_usr(n_decl.usr), (n_decl,))
+        self.assertTrue(all(x.decl is n_decl for x in n_decl.referrers))
+
+    def test_referrer_of_all_decls(self):
+        sample = """
+        typedef struct { int x; int y; } S;
+        void func2(int);
+        void func(S *s, int unused)
+        {
+            func2(s->x);
+            func2(s->x + 1);
+        }
+        void func2(int b)
+        {
+        }
+        """
+        root = self.parse(sample)
+        func, func2 = root.function_defs
+        s_parm, unused_parm = func.parameters
+        self.assertEqual(s_parm.referrer_count, 2)
+        self.assertEqual(unused_parm.referrer_count, 0)
+        self.assertEqual(list(unused_parm.iter_referrers()), [])
+        self.assertTrue(all(x.decl is s_parm for x in s_parm.iter_referrers()))
+
+        call_sites = list(func2.iter_call_sites())
+        self.assertEqual(len(call_sites), 2)
+        self.assertIs(call_sites[0], func.body.children[0])
+        self.assertEqual(list(root.function_decls[0].iter_call_sites()), call_sites)
+        self.assertEqual(list(func.iter_call_sites()), [])
+
+        x_field, y_field = root.type_decls[0].children
+        self.assertEqual(x_field.referrer_count, 2)
+        self.assertEqual(y_field.referrer_count, 0)
+        self.assertTrue(all(x.kind == "MEMBER_REF_EXPR" for x in x_field.iter_referrers()))
+
+    def test_tag_decl_wrapped_once(self):
+        sample = """
+        typedef struct tag { int a; struct inner { int b; } in; } T;
+        typedef enum { E1, E2 } E;
+        struct S { int x; } s, *ps;
+        """
+        root = self.parse(sample)
+        fields = list(root.nodes_of_type(cn.FieldDeclNode))
+        self.assertEqual([x.name for x in fields], ["a", "b", "in", "x"])
+        self.assertEqual([x.name for x in root.nodes_of_type(cn.EnumConstantDeclNode)], ["E1", "E2"])
+        self.assertEqual(root.type_decls[1].children, ())
+        self.assertIs(fields[0].parent, root.type_decls[0])
+
+    def test_initial_value(self):
+        sample = """
+        enum E { A, B = 2 } e;
+        struct S { int x; } s = {1}, *ps;
+        int arr[2] = {1, 2}, z;
+        int q = (3), r[4];
+        """
+        root = self.parse(sample)
+        variables = dict((x.name, x) for x in root.global_var_defs)
+        self.assertIsNone(variables["e"].initial_value)
+        self.assertIsInstance(variables["s"].initial_value, cn.InitListExprNode)
+        self.assertIsNone(variables["ps"].initial_value)
+        self.assertIsInstance(variables["arr"].initial_value, cn.InitListExprNode)
+        self.assertIsNone(variables["z"].initial_value)
+        self.assertEqual(variables["q"].initial_value.literal, 3)
+        self.assertIsNone(variables["r"].initial_value)
+
+    def test_nodes_of_kind(self):
+        sample = """
+        typedef struct tag { int x; } T;
+        void func2(int);
+        int global1 = 1;
+        void func(int a)
+        {
+            int i;
+            for (i = 0; i < a; i++) {
+                func2(i);
+            }
+            if (a) {
+                func2(a);
+            }
+        }
+        """
+        root = self.parse(sample)
+        calls = list(root.nodes_of_kind("CALL_EXPR"))
+        self.assertEqual(len(calls), 2)
+        self.assertTrue(all(isinstance(x, cn.CallExprNode) for x in calls))
+        self.assertEqual([x.arguments[0].name for x in calls], ["i", "a"])
+        self.assertEqual(list(root.nodes_of_type(cn.CallExprNode)), calls)
+        self.assertEqual(len(list(root.nodes_of_kind("FOR_STMT"))), 1)
+        self.assertEqual(list(root.nodes_of_kind("WHILE_STMT")), [])
+        self.assertEqual(list(root.nodes_of_kind(clang.cindex.CursorKind.CALL_EXPR)), calls)
+        self.assertEqual([x.kind for x in calls], ["CALL_EXPR", "CALL_EXPR"])
+        self.assertEqual(root.global_var_defs[0].storage_class, "NONE")
+
+        struct, = root.nodes_of_kind("STRUCT_DECL")
+        field, = root.nodes_of_kind("FIELD_DECL")
+        self.assertEqual(list(root.nodes_of_type(cn.FieldDeclNode)), [field])
+        self.assertIs(root.find_decl(field.file_id, field.offset), field)
+        self.assertIs(field.parent, struct)
+        self.assertEqual([x for x in root.nodes_overlapping(field.start_offset, field.end_offset) if x.kind == "FIELD_DECL"], [field])
+
+        decls = list(root.nodes_of_type(cn.DeclNode))
+        self.assertEqual([x.name for x in decls], ["x", "T", "global1", "func2", "", "func", "a", "i"])
+        self.assertEqual([x.node_id for x in decls], sorted(x.node_id for x in decls))
+
+    def test_designated_init(self):
+        sample = """
+        struct P { int a[3]; int b; };
+        int a[3] = {[1] = 5};
+        int r[8] = {[2 ... 4] = 7, 1};
+        struct P p = {.a[1] = 2, .b = 3};
+        """
+        root = self.parse(sample)
+        designators = list(root.nodes_of_type(cn.DesignatedInitExprNode))
+        self.assertEqual([x.field_names for x in designators], [(), (), ("a",), ("b",)])
+        self.assertEqual([[y.literal for y in x.indices] for x in designators], [[1], [2, 4], [1], []])
+        self.assertEqual([x.value.literal for x in designators], [5, 7, 2, 3])
+        self.assertIsInstance(root.global_var_defs[1].initial_value.children[1], cn.IntegerLiteralNode)
+
+    def test_literal(self):
+        sample = """
+        char *s = "a\\"b";
+        unsigned long long i[] = {10, 010, 0x10u, 5ULL, 18446744073709551615ULL};
+        """
+        root = self.parse(sample)
+        s, i = root.global_var_defs
+        self.assertEqual(s.initial_value.literal, '"a\\"b"')
+        self.assertEqual([x.literal for x in root.nodes_of_type(cn.IntegerLiteralNode)], [10, 8, 16, 5, 18446744073709551615])
+
+        self.assertEqual(cn.parse_integer_literal("010"), 8)
+        self.assertEqual(cn.parse_integer_literal("0"), 0)
+        self.assertEqual(cn.parse_integer_literal("0x1FuLL"), 31)
+        self.assertEqual(cn.parse_integer_literal("12l"), 12)
+
+    def test_token_spellings(self):
+        sample = """
+        int func(int x, int *p)
+        {
+            int y = (x + 1) * 2;
+            return x ? y : p[0] + -x;
+        }
+        """
+        root = self.parse(sample)
+        for cursor in root.function_defs[0].cursor.walk_preorder():
+            self.assertEqual(root.get_token_spellings(cursor), [x.spelling for x in cursor.get_tokens()])
+        self.assertEqual([x.operator for x in root.nodes_of_type(cn.BinaryOperatorNode)], ["*", "+", "+"])
+
+    def test_token_owners(self):
+        sample = """
+        void func2(int);
+        void func(int a)
+        {
+            func2((a + 1));
+        }
+        """
+        root = self.parse(sample)
+        owners = root.get_token_owners()
+        self.assertEqual(len(owners), len(root.get_token_table().spellings))
+        call = root.function_defs[0].body.children[0]
+        self.assertIs(root.find_token_owner(sample.index("func2((")), call.function)
+        self.assertIs(root.find_token_owner(sample.index("a + 1")), call.arguments[0].operands[0])
+        self.assertIs(root.find_token_owner(sample.index("+ 1")), call.arguments[0])
+        self.assertIs(root.find_token_owner(sample.index("(a + 1)")), call.arguments[0])
+        self.assertIsNone(root.find_token_owner(sample.index("func2((") - 1))
+
+        sample = """
+        struct S { int x; };
+        int func(struct S *a, struct S *b)
+        {
+            return a->x + b->x;
+        }
+        """
+        root = self.parse(sample)
+        for offset in (sample.index("S *a"), sample.index("S *b")):
+            owner = root.find_token_owner(offset)
+            self.assertEqual(owner.kind, "TYPE_REF")
+            self.assertEqual(owner.start_offset, offset)
+
+    def test_line_column(self):
+        header = """int h;
+        int hfunc(int x) { return x; }
+        """
+        sample = """#include "sample.h"
+        void func(int a)
+        {
+            hfunc(a +
+                  h);
+        }
+        """
+        include_dir = os.path.abspath("include")
+        index = clang.cindex.Index.create()
+        tu = index.parse("sample.c", args=["-I" + include_dir],
+                         unsaved_files=(("sample.c", sample), (os.path.join(include_dir, "sample.h"), header)))
+        root = cn.TranslationUnitNode(tu.cursor)
+        nodes = [x for x in root.nodes if x is not root]
+        self.assertEqual(len(set(x.file_id for x in nodes)), 2)
+        for node in nodes:
+            location = node.cursor.location
+            self.assertEqual((node.file_name, node.line, node.column), (location.file.name, location.line, location.column))
+
+    def test_node_at(self):
+        sample = """
+        int func(int a, int b)
+        {
+            int c = (a + b) * 2;
+            return c;
+        }
+        """
+        root = self.parse(sample)
+        function = root.function_defs[0]
+        decl = function.body.children[0].children[0]
+        multiply = decl.initial_value
+        add = multiply.operands[0]
+        for node in root.nodes:
+            if node is not root and node.cursor.extent.end.file:
+                self.assertEqual((node.start_offset, node.end_offset), (node.cursor.extent.start.offset, node.cursor.extent.end.offset))
+
+        self.assertIs(root.node_at(sample.index("a + b")), add.operands[0])
+        self.assertIs(root.node_at(sample.index("+ b")), add)
+        self.assertIs(root.node_at(sample.index("* 2")), multiply)
+        self.assertIs(root.node_at(sample.index("int c")), decl)
+        self.assertIs(root.node_at(sample.index("{")), function.body)
+        self.assertIs(root.node_at(sample.index("int func")), function)
+        self.assertIsNone(root.node_at(0))
+        self.assertIsNone(root.node_at(len(sample) - 1))
+
+        start = sample.index("b) * 2")
+        overlapping = root.nodes_overlapping(start, start + len("b) * 2"))
+        self.assertEqual(overlapping, [function, function.body, function.body.children[0], decl, multiply, add,
+                                       add.operands[1], multiply.operands[1]])
+        self.assertEqual(root.nodes_overlapping(0, 1), [])
+
+    def test_numbering(self):
+        sample = """
+        int g = 1;
+        int func(int a)
+        {
+            if (a)
+                return a + g;
+            return 0;
+        }
+        """
+        root = self.parse(sample)
+        function = root.function_defs[0]
+        if_node = function.body.children[0]
+        add = if_node.body.children[0]
+
+        postorder = []
+        def walk(node, depth):
+            self.assertEqual(root.get_depths()[node.node_id], depth)
+            for child in node.children:
+                walk(child, depth + 1)
+            postorder.append(node.node_id)
+        for node in root.nodes:
+            if node.parent is None and node is not root:
+                walk(node, 1)
+        postorder.append(root.node_id)
+        self.assertEqual([root.get_postorder()[x] for x in postorder], list(range(len(root.nodes))))
+
+        self.assertEqual(root.subtree(if_node)[0], if_node)
+        self.assertEqual(len(root.subtree(root)), len(root.nodes))
+        self.assertEqual(len(root.subtree(add)), 3)
+        self.assertTrue(root.is_ancestor(function, add))
+        self.assertTrue(root.is_ancestor(add, add))
+        self.assertFalse(root.is_ancestor(add, function))
+        self.assertFalse(root.is_ancestor(root.global_var_defs[0], add))
+        self.assertIs(root.enclosing_function(add), function)
+        self.assertIs(root.enclosing_function(function), function)
+        self.assertIsNone(root.enclosing_function(root.global_var_defs[0]))
+
+    def test_type_table(self):
+        sample = """
+        typedef unsigned int UINT;
+        UINT g1;
+        UINT g2;
+        unsigned int g3;
+        int func(UINT a, unsigned int b)
+        {
+            return (int)(a + b + g1);
+        }
+        """
+        root = self.parse(sample)
+        g1, g2, g3 = root.global_var_defs
+        self.assertEqual(g1.type_id, g2.type_id)
+        self.assertIs(g1.type, g2.type)
+        self.assertNotEqual(g1.type_id, g3.type_id)
+        self.assertEqual(g1.type.type_name, "UINT")
+        self.assertEqual(g1.type.canonical_type_name, "unsigned int")
+        self.assertEqual(g3.type.type_name, "unsigned int")
+        a, b = root.function_defs[0].parameters
+        self.assertIs(a.type, g1.type)
+        self.assertIs(b.type, g3.type)
+        self.assertEqual(root.function_defs[0].result_type.type_name, "int")
+        cast = next(root.nodes_of_type(cn.CStyleCastExprNode))
+        self.assertIs(cast.cast_type, root.function_defs[0].result_type)
+        self.assertEqual(len(root.types), len(set((x.type_name, x.canonical_type_name) for x in root.types)))
+
+    def test_cursor_cache(self):
+        sample = """
+        int func(int a, int b)
+        {
+            return a + b * 2;
+        }
+        """
+        root = self.parse(sample)
+        cache = root.cursor_cache
+        hits, misses = cache.stats()["children"]
+        self.assertGreater(hits, 0)
+        tu = root.translation_unit
+        cursor = tu.cursor
+        self.assertIs(cache.children(cursor), cache.children(cursor))
+        self.assertEqual(cache.stats()["children"], (hits + 2, misses))
+        tu.reparse(unsaved_files=(("sample.c", sample),))
+        children = cache.children(tu.cursor)
+        self.assertEqual(cache.stats()["children"], (hits + 2, misses + 1))
+        self.assertEqual([x.spelling for x in children], ["func"])
+
+        function = children[0]
+        self.assertEqual(list(root.get_token_spellings(function)), list(cache.tokens(function)))
+        self.assertIsInstance(cache.tokens(function), tuple)
+        self.assertEqual(cache.stats()["tokens"][1], 1)
+        self.assertRaises(ValueError, cache.register, "tokens", lambda cursor: ())
+        cache.clear()
+        self.assertEqual(sum(len(x) for x in cache.tables.values()), 0)
+
     def test_is_constant_value(self):
-        pass
+        sample = """
+        typedef unsigned int UINT32;
+        enum { RED, GREEN = 5, BLUE };
+        const int size = 4 * sizeof(UINT32);
+        int variable = 3;
+        struct S { char c[3]; };
+        int func(int a)
+        {
+            const UINT32 mask = ~(UINT32)0 >> 4;
+            int buffer[16];
+            return a + buffer[0]
+                + (BLUE - 1) * 2
+                + size / -3
+                + (int)mask
+                + (GREEN > 2 ? 10 % -3 : variable)
+                + (1 || a)
+                + variable
+                + sizeof(struct S)
+                + (unsigned char)300;
+        }
+        """
+        root = self.parse(sample)
+        function = root.function_defs[0]
+        # a + buffer[0] + (BLUE - 1) * 2 + ...
+        expected = [None, None, 10, -5, 0x0FFFFFFF, 1, 1, None, 3, 44]
+        terms = []
+        node = function.body.children[-1].body
+        while isinstance(node, cn.BinaryOperatorNode) and node.operator == "+":
+            terms.append(node.operands[1])
+            node = node.operands[0]
+        terms.append(node)
+        terms.reverse()
+        self.assertEqual([x.constant_value() for x in terms], expected)
+        self.assertEqual([x.is_constant_value() for x in terms], [x is not None for x in expected])
+        self.assertIn(terms[0].node_id, root.constant_values)
+        self.assertEqual([(x.name, x.value) for x in root.nodes_of_type(cn.EnumConstantDeclNode)], [("RED", 0), ("GREEN", 5), ("BLUE", 6)])
+        self.assertIsNone(function.body.constant_value())
+
+    def test_constant_value_conversions(self):
+        sample = """
+        long long values[] = {-1 < 1u, -6 / 2u, -7 % 2u, -1 == 0xFFFFFFFFu, (unsigned char)-1 < 0,
+                              -1L >> 1, 1u << 31 >> 31, (short)-2 * 3u, -1 + 0ULL};
+        """
+        root = self.parse(sample)
+        init_list = root.global_var_defs[0].initial_value
+        self.assertEqual([x.constant_value() for x in init_list.children],
+                         [0, 2147483645, 1, 1, 0, -1, 1, 4294967290, 18446744073709551615])
+
+    def test_sizeof(self):
+        sample = """
+        typedef struct S { char c[3]; } S;
+        long l;
+        double d;
+        unsigned short u;
+        int x;
+        unsigned long values[] = {sizeof(char[16]), sizeof(long), sizeof(long int), _Alignof(double), sizeof x,
+                                  sizeof(struct S), __alignof__(S), sizeof(struct S *), sizeof(short unsigned int),
+                                  _Alignof(long double)};
+        """
+        root = self.parse(sample)
+        operators = list(root.nodes_of_type(cn.UnaryExprNode))
+        self.assertEqual([x.operator for x in operators][3:7], ["_Alignof", "sizeof", "sizeof", "__alignof__"])
+        # Without clang_Cursor_Evaluate. Types libclang does not expose give
+        # None, as do builtin types not used elsewhere.
+        self.assertEqual([x.evaluate_operand_type(x.cursor) for x in operators],
+                         [None, 8, 8, 8, 4, 3, 1, None, 2, None])
+        if clang.cindex.Cursor.evaluate_integer(operators[0].cursor) is not None:
+            self.assertEqual([x.value for x in operators], [16, 8, 8, 8, 4, 3, 1, 8, 2, 16])
 
     def test_global_variable(self):
         sample = """
@@ -0,0 +1,65 @@
+import unittest
+import clang
+import clang.cindex
+import clang_ast_wrapper.node as cn
+import clang_ast_wrapper.protocol as cp
+
+HEADER = """
+typedef struct _PROTOCOL {
+    int Revision;
+    int (*Read)(struct _PROTOCOL *This, int Size);
+    int (*Write)(struct _PROTOCOL *This, int Size);
+} PROTOCOL;
+"""
+
+class TestProtocol(unittest.TestCase):
+    def parse(self, name, content):
+        index = clang.cindex.Index.create()
+        tu = index.parse(name, unsaved_files=((name, HEADER + content),))
+        root = cn.TranslationUnitNode(tu.cursor)
+        return root
+
+    def test_protocol_index(self):
+        driver_c = """
+        static int ReadA(PROTOCOL *This, int Size) { return 0; }
+        static int WriteA(PROTOCOL *This, int Size) { return 0; }
+        static int ReadB(PROTOCOL *This, int Size) { return 1; }
+        static int WriteB(PROTOCOL *This, int Size) { return 1; }
+        PROTOCOL ProtocolA = { 1, ReadA, WriteA };
+        PROTOCOL ProtocolB = { .Write = WriteB, .Revision = 2 };
+        void install(PROTOCOL *p) { p->Read = &ReadB; }
+        """
+        user_c = """
+        int use(PROTOCOL *p)
+        {
+            return p->Read(p, 1) + p->Write(p, 2) + p->Read(p, 3);
+        }
+        """
+        index = cp.ProtocolIndex()
+        index.update("driver.c", self.parse("driver.c", driver_c))
+        index.update("user.c", self.parse("user.c", user_c))
+
+        key = ("struct _PROTOCOL", "Read")
+        self.assertEqual([x[1] for x in index.targets(*key)], ["ReadA", "ReadB"])
+        self.assertEqual([x[1] for x in index.targets("struct _PROTOCOL", "Write")], ["WriteA", "WriteB"])
+        self.assertEqual(index.targets("struct _PROTOCOL", "Revision"), [])
+        self.assertEqual(len(index.assignment_sites("struct _PROTOCOL", "Revision")), 2)
+        calls = index.call_sites(*key)
+        self.assertEqual([(x.unit, x.caller) for x in calls], [("user.c", "use")] * 2)
+        self.assertEqual(len(index.call_sites("struct _PROTOCOL", "Write")), 1)
+        self.assertIn(key, index.members())
+
+        index.update("a.c", self.parse("a.c", user_c.replace("use", "use_a")))
+        self.assertEqual([(x.unit, x.caller) for x in index.call_sites(*key)], [("a.c", "use_a")] * 2 + [("user.c", "use")] * 2)
+        index.update("driver.c", self.parse("driver.c", driver_c.replace("p->Read = &ReadB;", "")))
+        self.assertEqual([x[1] for x in index.targets(*key)], ["ReadA"])
+        self.assertEqual(len(index.call_sites(*key)), 4)
+        index.update("a.c", self.parse("a.c", ""))
+        self.assertEqual([(x.unit, x.caller) for x in index.call_sites(*key)], [("user.c", "use")] * 2)
+
+        index.remove("driver.c")
+        self.assertEqual(index.targets(*key), [])
+        self.assertEqual(len(index.call_sites(*key)), 2)
+        self.assertNotIn(("struct _PROTOCOL", "Revision"), index.members())
+        index.remove("user.c")
+        self.assertEqual(index.members(), [])
@@ -58,3 +58,41 @@ class TestUtil(unittest.TestCase):
         Func3 = root.function_decls[0].body.children[2]
         self.assertTrue(cu.is_function_call(Func3, "Func", "BS2"))
         self.assertFalse(cu.is_function_call(Func3, "Func", "struct tag_BS"))
+
+    def test_call_matcher(self):
+        sample = """
+        void puts(const char *);
+        typedef void (*func_type)(void);
+        typedef struct tag_BS {
+            func_type Func;
+            func_type Other;
+        } BS;
+        typedef struct {
+            func_type Func;
+        } BS2;
+        BS *pBS;
+        BS gBS;
+        BS2 gBS2;
+        int main(int argc, char *argv[])
+        {
+            puts("string");
+            pBS->Func();
+            gBS.Func();
+            gBS2.Func();
+            gBS.Other();
+            return 0;
+        }
+        """
+        root = self.parse(sample)
+        matcher = cu.CallMatcher([("puts",), ("Func", "BS"), ("Func", "struct  tag_BS"), ("Unused", "BS")])
+        matcher.add_target("Other", "BS2")
+        found = list(matcher.find_calls(root))
+        body = root.function_defs[0].body
+        self.assertEqual([x[0] for x in found], list(body.children[0:3]))
+        self.assertEqual(found[0][1], (("puts", None),))
+        self.assertEqual(set(found[1][1]), {("Func", "BS"), ("Func", "struct  tag_BS")})
+        self.assertEqual(set(found[2][1]), {("Func", "BS"), ("Func", "struct  tag_BS")})
+        self.assertEqual(matcher.match(body.children[3]), ())
+        self.assertEqual(matcher.match(body.children[4]), ())
+        for node in root.nodes_of_type(cn.CallExprNode):
+            self.assertEqual(bool(matcher.match(node)), any(cu.is_function_call(node, *x) for x in [("puts",), ("Func", "BS"), ("Func", "struct tag_BS")]))
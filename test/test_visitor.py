@@ -0,0 +1,92 @@
+import unittest
+import clang
+import clang.cindex
+import clang_ast_wrapper.node as cn
+import clang_ast_wrapper.visitor as cv
+
+class KindCollector(cv.NodeVisitor):
+    def __init__(self):
+        self.names = []
+        self.left = []
+
+    def visit_DeclNode(self, node):
+        self.names.append(node.name)
+
+    def visit_FunctionDeclNode(self, node):
+        self.names.append("function " + node.name)
+
+    def leave_FunctionDeclNode(self, node):
+        self.left.append(node.name)
+
+class CallCollector(cv.NodeVisitor):
+    def __init__(self, skip):
+        self.skip = skip
+        self.calls = []
+
+    def visit_IfStmtNode(self, node):
+        if self.skip:
+            return cv.SKIP
+
+    def visit_CallExprNode(self, node):
+        self.calls.append(node.arguments[0].name)
+
+class ConstantFolder(cv.NodeTransformer):
+    def leave_BinaryOperatorNode(self, node):
+        left, right = node.operands
+        if node.operator == "+" and isinstance(left, cn.IntegerLiteralNode) and isinstance(right, cn.IntegerLiteralNode):
+            left.literal += right.literal
+            return left
+        return node
+
+class TestVisitor(unittest.TestCase):
+    def parse(self, content):
+        index = clang.cindex.Index.create()
+        tu = index.parse("sample.c", unsaved_files=(("sample.c", content),))
+        root = cn.TranslationUnitNode(tu.cursor)
+        return root
+
+    def test_visitor(self):
+        sample = """
+        void func2(int);
+        void func(int a)
+        {
+            int b = a;
+            func2(a);
+            if (a) {
+                func2(b);
+            }
+        }
+        """
+        root = self.parse(sample)
+        collector = KindCollector()
+        for function in root.function_decls:
+            collector.visit(function)
+        self.assertEqual(collector.names, ["function func2", "", "function func", "a", "b"])
+        self.assertEqual(collector.left, ["func2", "func"])
+
+        all_calls = CallCollector(False)
+        outer_calls = CallCollector(True)
+        other = KindCollector()
+        cv.visit_all(root.function_defs[0], [all_calls, outer_calls, other])
+        self.assertEqual(all_calls.calls, ["a", "b"])
+        self.assertEqual(outer_calls.calls, ["a"])
+        self.assertEqual(other.names, ["function func", "a", "b"])
+        self.assertEqual(other.left, ["func"])
+
+    def test_transformer(self):
+        sample = """
+        int func(int a)
+        {
+            return a * (1 + 2 + 3);
+        }
+        """
+        root = self.parse(sample)
+        function = root.function_defs[0]
+        self.assertIs(ConstantFolder().visit(function), function)
+        multiply = next(root.nodes_of_type(cn.BinaryOperatorNode))
+        self.assertEqual(multiply.operator, "*")
+        literal = multiply.operands[1]
+        self.assertIsInstance(literal, cn.IntegerLiteralNode)
+        self.assertEqual(literal.literal, 6)
+        self.assertEqual(multiply.children, multiply.operands)
+        self.assertIs(literal.parent, multiply)